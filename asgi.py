@@ -0,0 +1,154 @@
+"""
+ASGI-точка входа: ``uvicorn asgi:app --workers 4`` (см. README, раздел
+«Асинхронный режим»).
+
+Асинхронно, через ``AsyncAuctionDB``, обслуживаются долгие выгрузки отчётов
+(``/reports/...?format=csv|ndjson``) и поток событий
+``/auctions/<id>/events``: ожидание БД и медленного клиента не занимает
+поток. Все остальные запросы, включая HTML-страницы отчётов, обрабатывает
+прежнее Flask-приложение в пуле из WEB_THREADS потоков.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import exports
+import queries
+from async_db import AsyncAuctionDB, close_async_pool, get_async_pool
+from events import TooManySubscribers, get_event_hub
+from main import app as flask_app, default_period
+
+flask = WSGIMiddleware(flask_app, workers=int(os.getenv("WEB_THREADS", "4")))
+
+
+class ReportExport:
+    """
+    Выгрузка отчёта в CSV или NDJSON из серверного курсора; запросы без
+    ``format`` (HTML-страница) передаются Flask-приложению.
+    """
+
+    def __init__(self, name: str, sql: str, with_period: bool) -> None:
+        self.name = name
+        self.sql = sql
+        self.with_period = with_period
+
+    def _params(self, request: Request) -> tuple:
+        if not self.with_period:
+            return ()
+        start_default, end_default = default_period()
+        try:
+            return queries.period_bounds(
+                request.query_params.get("start") or start_default,
+                request.query_params.get("end") or end_default,
+            )
+        except ValueError:
+            # Как period_from_request во Flask: некорректный период заменяется периодом по умолчанию.
+            return queries.period_bounds(start_default, end_default)
+
+    async def _body(self, export_format: str, params: tuple) -> AsyncIterator[str]:
+        serialize = exports.ASYNC_SERIALIZERS[export_format]
+        async with AsyncAuctionDB() as db:
+            rows = db.stream(
+                self.sql,
+                params,
+                batch_size=flask_app.config["STREAM_BATCH_SIZE"],
+                with_columns=True,
+            )
+            columns = await rows.__anext__()
+            async for chunk in serialize(columns, rows):
+                yield chunk
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        request = Request(scope, receive)
+        export_format = request.query_params.get("format")
+        if export_format not in exports.ASYNC_SERIALIZERS:
+            await flask(scope, receive, send)
+            return
+        extension, mimetype, _ = exports.FORMATS[export_format]
+        response = StreamingResponse(
+            self._body(export_format, self._params(request)),
+            media_type=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{self.name}.{extension}"'},
+        )
+        await response(scope, receive, send)
+
+
+class AuctionEvents:
+    """
+    Поток событий аукциона. Подписка снимается после отправки ответа при
+    любом исходе, в том числе если тело ответа так и не начали читать
+    (HEAD-запрос, клиент отключился сразу).
+    """
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        request = Request(scope, receive)
+        auction_id = request.path_params["auction_id"]
+        async with AsyncAuctionDB() as db:
+            found = await db.get("SELECT 1 AS found FROM auctions WHERE id = %s", (auction_id,))
+        if found is None:
+            response: Response = JSONResponse({"error": "Аукцион не найден."}, status_code=404)
+            await response(scope, receive, send)
+            return
+        hub = get_event_hub()
+        try:
+            subscription = hub.subscribe(
+                auction_id, request.headers.get("Last-Event-ID"), loop=asyncio.get_running_loop()
+            )
+        except TooManySubscribers as exc:
+            response = JSONResponse(
+                {"error": str(exc)}, status_code=503, headers={"Retry-After": "30"}
+            )
+            await response(scope, receive, send)
+            return
+        response = StreamingResponse(
+            hub.astream(subscription, flask_app.config["EVENTS_HEARTBEAT"]),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        try:
+            await response(scope, receive, send)
+        finally:
+            hub.unsubscribe(subscription)
+
+
+@asynccontextmanager
+async def lifespan(_: Starlette) -> AsyncIterator[None]:
+    await get_async_pool()
+    yield
+    await close_async_pool()
+
+
+app = Starlette(
+    routes=[
+        Route(
+            "/reports/auction-revenue",
+            ReportExport("auction_revenue", queries.AUCTION_REVENUE_SQL, with_period=False),
+        ),
+        Route("/reports/sold-items", ReportExport("sold_items", queries.SOLD_ITEMS_SQL, True)),
+        Route(
+            "/reports/seller-revenue",
+            ReportExport("seller_revenue", queries.SELLER_REVENUE_SQL, True),
+        ),
+        Route(
+            "/reports/active-buyers",
+            ReportExport("buyers_in_period", queries.BUYERS_IN_PERIOD_SQL, True),
+        ),
+        Route("/reports/buyer-counts", ReportExport("buyer_counts", queries.BUYER_COUNTS_SQL, True)),
+        Route(
+            "/reports/sellers-participated",
+            ReportExport("sellers_participated", queries.SELLERS_PARTICIPATED_SQL, True),
+        ),
+        Route("/auctions/{auction_id:int}/events", AuctionEvents()),
+        Mount("/", app=flask),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,246 @@
+"""
+Асинхронный доступ к PostgreSQL для ASGI-приложения (см. asgi.py).
+
+``AsyncAuctionDB`` повторяет методы ``db.AuctionDB`` (``query``, ``get``,
+``stream``, ``execute``, ``executemany``, ``transaction``) на psycopg 3.
+Плейсхолдеры те же (``%s`` и ``%(name)s``), поэтому запросы из queries.py
+используются без изменений. Ожидание ответа БД не занимает поток: на одном
+цикле событий одновременно выполняется столько запросов, сколько
+подключений в пуле, а остальные ждут подключение.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
+from itertools import islice
+from typing import Any, AsyncIterator, Iterable, Optional
+
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row, namedtuple_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
+
+import migrations
+from db import _VALUES_TEMPLATE, connect
+
+ROW_FACTORIES = {
+    "dict": dict_row,
+    "tuple": tuple_row,
+    "record": namedtuple_row,
+}
+
+
+def conninfo() -> str:
+    """Строка подключения из тех же переменных окружения, что у ``db.connect``."""
+    return make_conninfo(
+        dbname=os.getenv("DB_NAME", "auction"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", ""),
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+    )
+
+
+def _ensure_schema() -> None:
+    conn = connect()
+    try:
+        migrations.ensure_schema(conn)
+    finally:
+        conn.close()
+
+
+_pool: AsyncConnectionPool | None = None
+_pool_pid: int | None = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """
+    Возвращает асинхронный пул процесса, при первом вызове проверяя схему БД
+    и открывая пул. Пул отдельный от ``db.get_pool``; его размеры задают
+    переменные окружения:
+    - DB_ASYNC_POOL_MIN (по умолчанию: 1);
+    - DB_ASYNC_POOL_MAX (по умолчанию: 10);
+    - DB_ASYNC_POOL_TIMEOUT (по умолчанию: 30) — сколько секунд ждать свободное
+      подключение; ожидающий запрос не занимает поток, поэтому ждать можно дольше;
+    - DB_POOL_MAX_LIFETIME (по умолчанию: 1800) — как у синхронного пула.
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        async with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                await asyncio.to_thread(_ensure_schema)
+                # autocommit: каждый запрос вне transaction() — отдельная
+                # транзакция, подключение не остаётся «idle in transaction».
+                pool = AsyncConnectionPool(
+                    conninfo(),
+                    min_size=int(os.getenv("DB_ASYNC_POOL_MIN", "1")),
+                    max_size=int(os.getenv("DB_ASYNC_POOL_MAX", "10")),
+                    timeout=float(os.getenv("DB_ASYNC_POOL_TIMEOUT", "30")),
+                    max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+                    kwargs={"autocommit": True},
+                    open=False,
+                )
+                await pool.open()
+                _pool = pool
+                _pool_pid = os.getpid()
+    return _pool
+
+
+async def close_async_pool() -> None:
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        await _pool.close()
+    _pool = None
+
+
+# Протокол PostgreSQL передаёт число параметров запроса 16-битным полем.
+MAX_QUERY_PARAMS = 65535
+
+
+def _pages(seq: Iterable[Any], size: int) -> Iterable[list[Any]]:
+    items = iter(seq)
+    while page := list(islice(items, size)):
+        yield page
+
+
+class AsyncAuctionDB:
+    """
+    Асинхронная обёртка над подключением из пула:
+
+        async with AsyncAuctionDB() as db:
+            rows = await db.query(queries.SOLD_ITEMS_SQL, bounds)
+
+    Подключение берётся из ``pool`` (по умолчанию ``get_async_pool()``) при
+    входе в блок и возвращается при выходе. ``row_factory`` и ``page_size``
+    работают как у ``AuctionDB``. ``execute`` и ``executemany`` фиксируют
+    изменения сразу, если не вызваны внутри ``transaction()``.
+    """
+
+    def __init__(
+        self,
+        pool: AsyncConnectionPool | None = None,
+        row_factory: str = "dict",
+        page_size: int | None = None,
+    ) -> None:
+        if row_factory not in ROW_FACTORIES:
+            raise ValueError(f"Неизвестный режим строк: {row_factory}")
+        self.pool = pool
+        self.row_factory = row_factory
+        self.page_size = (
+            page_size if page_size is not None else int(os.getenv("DB_BATCH_PAGE_SIZE", "1000"))
+        )
+        self.conn: Any = None
+
+    async def __aenter__(self) -> "AsyncAuctionDB":
+        if self.pool is None:
+            self.pool = await get_async_pool()
+        self.conn = await self.pool.getconn()
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.close()
+
+    def _cursor(self, row_factory: str | None, name: str | None = None) -> Any:
+        factory = ROW_FACTORIES[row_factory or self.row_factory]
+        if name is not None:
+            return self.conn.cursor(name, row_factory=factory)
+        return self.conn.cursor(row_factory=factory)
+
+    async def query(
+        self,
+        sql: str,
+        params: Iterable[Any] | None = None,
+        row_factory: str | None = None,
+    ) -> list[Any]:
+        async with self._cursor(row_factory) as cur:
+            await cur.execute(sql, params or ())
+            return await cur.fetchall()
+
+    async def get(
+        self,
+        sql: str,
+        params: Iterable[Any] | None = None,
+        row_factory: str | None = None,
+    ) -> Optional[Any]:
+        async with self._cursor(row_factory) as cur:
+            await cur.execute(sql, params or ())
+            return await cur.fetchone()
+
+    async def stream(
+        self,
+        sql: str,
+        params: Iterable[Any] | None = None,
+        batch_size: int = 2000,
+        row_factory: str | None = None,
+        with_columns: bool = False,
+    ) -> AsyncIterator[Any]:
+        """
+        Построчно отдаёт результат через серверный курсор пачками по
+        ``batch_size``; ``with_columns`` — как у ``AuctionDB.stream``.
+        """
+        # Серверный курсор живёт только внутри транзакции.
+        async with self.conn.transaction():
+            async with self._cursor(row_factory, name=f"stream_{uuid.uuid4().hex}") as cur:
+                cur.itersize = batch_size
+                await cur.execute(sql, params or ())
+                if with_columns:
+                    first = await cur.fetchmany(batch_size)
+                    yield [column.name for column in cur.description]
+                    for row in first:
+                        yield row
+                async for row in cur:
+                    yield row
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["AsyncAuctionDB"]:
+        """
+        Блок в одной транзакции; вложенный блок — точка сохранения
+        (как ``AuctionDB.transaction``).
+        """
+        async with self.conn.transaction():
+            yield self
+
+    async def execute(self, sql: str, params: Iterable[Any] | None = None) -> int:
+        async with self._cursor("dict") as cur:
+            await cur.execute(sql, params or ())
+            row = await cur.fetchone() if cur.description else None
+        return int(row["id"]) if row and row["id"] is not None else 0
+
+    async def executemany(
+        self,
+        sql: str,
+        seq_of_params: Iterable[Iterable[Any]],
+        page_size: int | None = None,
+    ) -> None:
+        """
+        Выполняет запрос для каждого набора параметров в одной транзакции.
+        Запрос вида ``INSERT ... VALUES %s`` отправляется одной многострочной
+        вставкой на каждые ``page_size`` наборов, как ``execute_values`` в
+        ``AuctionDB.executemany``; остальные — конвейером psycopg.
+        """
+        page_size = page_size or self.page_size
+        template = _VALUES_TEMPLATE.search(sql)
+        async with self.transaction(), self.conn.cursor() as cur:
+            for page in _pages(seq_of_params, page_size):
+                if template is None:
+                    await cur.executemany(sql, page)
+                    continue
+                page = [tuple(params) for params in page]
+                ncols = len(page[0])
+                row = "(" + ", ".join(["%s"] * ncols) + ")"
+                # Широкие строки уменьшают страницу, чтобы не превысить
+                # предел параметров в одном запросе.
+                for rows in _pages(page, max(1, MAX_QUERY_PARAMS // max(ncols, 1))):
+                    statement = (
+                        f"{sql[:template.start()]}VALUES {', '.join([row] * len(rows))}"
+                        f"{sql[template.end():]}"
+                    )
+                    await cur.execute(statement, [value for params in rows for value in params])
+
+    async def close(self) -> None:
+        if self.conn is None:
+            return
+        await self.pool.putconn(self.conn)
+        self.conn = None
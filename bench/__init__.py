@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+import subprocess
+
+
+def git_commit() -> str | None:
+    """Текущий коммит репозитория для отчётов бенчмарков (``None`` вне git)."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from datetime import date
+from urllib.parse import urlencode
+
+from bench import git_commit
+from bench.http_load import ENDPOINTS, percentile, report_period
+from bench.serving import label, parse_server, start_server, wait_ready
+
+REPORTS = [name for name, (_, path, _) in ENDPOINTS.items() if path.startswith("/reports/")]
+
+
+class Client(threading.Thread):
+    """Клиент выгружает отчёт целиком, пока не закончатся запросы в общем счётчике."""
+
+    def __init__(
+        self, port: int, path: str, remaining: list[int], lock: threading.Lock, timeout: float, delay: float
+    ) -> None:
+        super().__init__(daemon=True)
+        self.port = port
+        self.path = path
+        self.remaining = remaining
+        self.lock = lock
+        self.timeout = timeout
+        self.delay = delay
+        self.latencies: list[float] = []
+        self.bytes = 0
+        self.errors = 0
+
+    def _take(self) -> bool:
+        with self.lock:
+            if self.remaining[0] <= 0:
+                return False
+            self.remaining[0] -= 1
+            return True
+
+    def run(self) -> None:
+        while self._take():
+            begin = time.perf_counter()
+            conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=self.timeout)
+            try:
+                conn.request("GET", self.path)
+                response = conn.getresponse()
+                while chunk := response.read(64 * 1024):
+                    self.bytes += len(chunk)
+                    if self.delay:
+                        # Медленный клиент: сервер ждёт, пока он дочитает ответ.
+                        time.sleep(self.delay)
+                if response.status != 200:
+                    self.errors += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                continue
+            finally:
+                conn.close()
+            self.latencies.append(time.perf_counter() - begin)
+
+
+class Probe(threading.Thread):
+    """Во время выгрузок замеряет задержку быстрого запроса ``/health/pool``."""
+
+    def __init__(self, port: int, interval: float, stop: threading.Event) -> None:
+        super().__init__(daemon=True)
+        self.port = port
+        self.interval = interval
+        self.stop = stop
+        self.latencies: list[float] = []
+        self.errors = 0
+
+    def run(self) -> None:
+        while not self.stop.is_set():
+            begin = time.perf_counter()
+            conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            try:
+                conn.request("GET", "/health/pool")
+                conn.getresponse().read()
+                self.latencies.append(time.perf_counter() - begin)
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+            finally:
+                conn.close()
+            self.stop.wait(self.interval)
+
+
+def _ms(values: list[float], share: float) -> float:
+    return round(1000 * percentile(values, share), 1)
+
+
+def run_server(server: tuple[str, int, int], args: argparse.Namespace, path: str) -> dict:
+    # Одинаковое число подключений к БД у синхронного и асинхронного пула.
+    env = {"DB_POOL_MAX": str(args.db_connections), "DB_ASYNC_POOL_MAX": str(args.db_connections)}
+    process = start_server(server, args.port, env)
+    try:
+        wait_ready(args.port, process)
+        remaining = [args.requests]
+        lock = threading.Lock()
+        clients = [
+            Client(args.port, path, remaining, lock, args.timeout, args.client_delay)
+            for _ in range(args.concurrency)
+        ]
+        stop = threading.Event()
+        probe = Probe(args.port, args.probe_interval, stop)
+        started = time.perf_counter()
+        probe.start()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        probe.join()
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+
+    latencies = sorted(value for client in clients for value in client.latencies)
+    probes = sorted(probe.latencies)
+    transferred = sum(client.bytes for client in clients)
+    return {
+        "completed": len(latencies),
+        "errors": sum(client.errors for client in clients),
+        "seconds": round(elapsed, 2),
+        "reports_per_second": round(len(latencies) / elapsed, 2),
+        "mb_per_second": round(transferred / elapsed / 1_000_000, 2),
+        "report_p50_ms": _ms(latencies, 0.50),
+        "report_p95_ms": _ms(latencies, 0.95),
+        "report_max_ms": round(1000 * latencies[-1], 1) if latencies else 0.0,
+        "probe_requests": len(probes),
+        "probe_errors": probe.errors,
+        "probe_p50_ms": _ms(probes, 0.50),
+        "probe_p95_ms": _ms(probes, 0.95),
+        "probe_max_ms": round(1000 * probes[-1], 1) if probes else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Параллельные выгрузки медленного отчёта: синхронный gunicorn против "
+            "ASGI-приложения с AsyncAuctionDB, плюс задержка быстрого запроса под этой нагрузкой."
+        )
+    )
+    parser.add_argument(
+        "--server",
+        type=parse_server,
+        action="append",
+        help="Как у bench.serving; по умолчанию gunicorn:1:8 и uvicorn:1:8",
+    )
+    parser.add_argument("--report", choices=REPORTS, default="sold_items", help="Какой отчёт выгружать")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="ndjson", help="Формат выгрузки")
+    parser.add_argument("--period-days", type=int, default=365, help="Длина периода отчёта, дней")
+    parser.add_argument(
+        "--until", type=date.fromisoformat, default=date.today(), help="Последний день периода"
+    )
+    parser.add_argument("--requests", type=int, default=256, help="Сколько выгрузок всего")
+    parser.add_argument("--concurrency", type=int, default=64, help="Одновременных выгрузок")
+    parser.add_argument(
+        "--db-connections", type=int, default=8, help="Размер пула подключений к БД у обоих серверов"
+    )
+    parser.add_argument(
+        "--client-delay",
+        type=float,
+        default=0.0,
+        help="Пауза клиента после каждых 64 КБ ответа, с (имитация медленной сети)",
+    )
+    parser.add_argument("--probe-interval", type=float, default=0.1, help="Интервал быстрых запросов, с")
+    parser.add_argument("--port", type=int, default=5055, help="Порт для запускаемого сервера")
+    parser.add_argument("--timeout", type=float, default=300, help="Таймаут выгрузки, с")
+    parser.add_argument("--output", help="Куда записать JSON-отчёт")
+    args = parser.parse_args()
+
+    _, report_path, with_period = ENDPOINTS[args.report]
+    query = {"format": args.format}
+    if with_period:
+        query.update(report_period(args.until, args.period_days))
+    path = f"{report_path}?{urlencode(query)}"
+
+    servers = args.server or [("gunicorn", 1, 8), ("uvicorn", 1, 8)]
+    results = {}
+    print(f"{path}: {args.requests} выгрузок по {args.concurrency} одновременно")
+    print(
+        f"{'сервер':<16} {'отчётов/с':>10} {'МБ/с':>8} {'p50, мс':>9} {'p95, мс':>9} "
+        f"{'ошибок':>7} {'проба p95, мс':>14} {'проба max, мс':>14}"
+    )
+    for server in servers:
+        stats = run_server(server, args, path)
+        results[label(server)] = stats
+        print(
+            f"{label(server):<16} {stats['reports_per_second']:>10.2f} {stats['mb_per_second']:>8.2f} "
+            f"{stats['report_p50_ms']:>9.1f} {stats['report_p95_ms']:>9.1f} {stats['errors']:>7} "
+            f"{stats['probe_p95_ms']:>14.1f} {stats['probe_max_ms']:>14.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "config": {
+                        "path": path,
+                        "requests": args.requests,
+                        "concurrency": args.concurrency,
+                        "db_connections": args.db_connections,
+                        "client_delay": args.client_delay,
+                    },
+                    "servers": results,
+                },
+                output,
+                ensure_ascii=False,
+                indent=2,
+                sort_keys=True,
+            )
+            output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
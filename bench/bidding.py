@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from decimal import Decimal
+
+from bench import git_commit
+from bench.http_load import percentile
+from bidding import BidBook, BidRejected
+from db import AuctionDB, ConnectionPool
+
+
+class Bidder(threading.Thread):
+    """Поток-участник: перебивает текущую ставку на случайном лоте до окончания замера."""
+
+    def __init__(
+        self,
+        book: BidBook,
+        pool: ConnectionPool,
+        lots: list[int],
+        bidders: list[int],
+        seed: int,
+        deadline: float,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.book = book
+        self.pool = pool
+        self.lots = lots
+        self.bidders = bidders
+        self.rng = random.Random(seed)
+        self.deadline = deadline
+        self.accepted = 0
+        self.rejected = 0
+        self.latencies: list[float] = []
+        self._db: AuctionDB | None = None
+
+    def _get_db(self) -> AuctionDB:
+        if self._db is None:
+            self._db = AuctionDB(pool=self.pool)
+        return self._db
+
+    def run(self) -> None:
+        increment = self.book.increment
+        try:
+            while time.monotonic() < self.deadline:
+                item_id = self.rng.choice(self.lots)
+                lot = self.book.lot(item_id, self._get_db)
+                bidder_id = self.rng.choice(self.bidders)
+                if bidder_id == lot.seller_id:
+                    continue
+                # Цена читается без блокировки, как клиент видит её на странице:
+                # параллельные ставки других потоков делают часть ставок устаревшими.
+                amount = lot.minimum(increment) + increment * self.rng.randint(0, 2)
+                begin = time.perf_counter()
+                try:
+                    self.book.place(item_id, bidder_id, amount, self._get_db)
+                    self.accepted += 1
+                except BidRejected:
+                    self.rejected += 1
+                self.latencies.append(time.perf_counter() - begin)
+        finally:
+            if self._db is not None:
+                self._db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Замер приёма ставок книгой ставок (bidding.py): ставок в секунду на лот, "
+            "задержка проверки ставки и время записи очереди в БД."
+        )
+    )
+    parser.add_argument("--lots", type=int, default=1, help="На сколько лотов одновременно идут ставки")
+    parser.add_argument("--threads", type=int, default=8, help="Число параллельных участников")
+    parser.add_argument("--duration", type=float, default=10, help="Длительность замера, с")
+    parser.add_argument("--increment", type=Decimal, default=Decimal("100"), help="Шаг ставки")
+    parser.add_argument("--batch-size", type=int, default=500, help="Ставок в одной записи в БД")
+    parser.add_argument(
+        "--flush-interval", type=float, default=0.05, help="Наибольшая задержка записи ставки, с"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Зерно выбора лотов и участников")
+    parser.add_argument(
+        "--keep", action="store_true", help="Не удалять записанные замером ставки из БД"
+    )
+    parser.add_argument("--output", help="Куда записать JSON-отчёт")
+    args = parser.parse_args()
+
+    pool = ConnectionPool(minconn=1, maxconn=args.threads + 2)
+    db = AuctionDB(pool=pool)
+    try:
+        lots = [
+            row["id"]
+            for row in db.query(
+                "SELECT id FROM items WHERE NOT is_sold ORDER BY id LIMIT %s", (args.lots,)
+            )
+        ]
+        bidders = [row["id"] for row in db.query("SELECT id FROM participants LIMIT 1000")]
+        if len(lots) < args.lots or len(bidders) < 2:
+            raise SystemExit("Недостаточно непроданных лотов или участников; заполните БД seed_data.py.")
+        last_bid_id = db.get("SELECT COALESCE(MAX(id), 0) AS id FROM bids")["id"]
+    finally:
+        db.close()
+
+    book = BidBook(args.increment, batch_size=args.batch_size, flush_interval=args.flush_interval)
+    deadline = time.monotonic() + args.duration
+    workers = [
+        Bidder(book, pool, lots, bidders, args.seed + n, deadline) for n in range(args.threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    drain_started = time.perf_counter()
+    book.writer.flush()
+    drain = time.perf_counter() - drain_started
+
+    accepted = sum(w.accepted for w in workers)
+    rejected = sum(w.rejected for w in workers)
+    latencies = sorted(value for w in workers for value in w.latencies)
+    stats = book.stats()
+    db = AuctionDB(pool=pool)
+    try:
+        stored = db.get(
+            "SELECT COUNT(*) AS bids FROM bids WHERE id > %s AND item_id = ANY(%s)",
+            (last_bid_id, lots),
+        )
+        high_bids = {
+            row["item_id"]: row["amount"]
+            for row in db.query(
+                "SELECT item_id, MAX(amount) AS amount FROM bids WHERE item_id = ANY(%s) GROUP BY item_id",
+                (lots,),
+            )
+        }
+        # Наибольшая ставка в БД должна совпасть с текущей ставкой в памяти.
+        mismatched = [
+            item_id
+            for item_id in lots
+            if high_bids.get(item_id) != book.lot(item_id, lambda: db).high_bid
+        ]
+        if not args.keep:
+            db.execute("DELETE FROM bids WHERE id > %s AND item_id = ANY(%s)", (last_bid_id, lots))
+    finally:
+        db.close()
+        book.close()
+        pool.closeall()
+
+    report = {
+        "commit": git_commit(),
+        "config": {
+            "lots": args.lots,
+            "threads": args.threads,
+            "duration": args.duration,
+            "increment": str(args.increment),
+            "batch_size": args.batch_size,
+            "flush_interval": args.flush_interval,
+            "seed": args.seed,
+        },
+        "accepted": accepted,
+        "rejected": rejected,
+        "accepted_per_second": round(accepted / args.duration, 1),
+        "accepted_per_second_per_lot": round(accepted / args.duration / args.lots, 1),
+        "place_p50_us": round(1e6 * percentile(latencies, 0.50), 1),
+        "place_p99_us": round(1e6 * percentile(latencies, 0.99), 1),
+        "batches": stats["batches"],
+        "mean_batch": round(stats["written"] / stats["batches"], 1) if stats["batches"] else 0.0,
+        "drain_seconds": round(drain, 3),
+        "stored": stored["bids"],
+        "failed": stats["failed"],
+        "high_bid_mismatches": mismatched,
+    }
+
+    print(
+        f"Принято {accepted} ставок ({report['accepted_per_second']:.0f}/с, "
+        f"{report['accepted_per_second_per_lot']:.0f}/с на лот), отклонено {rejected}"
+    )
+    print(
+        f"Проверка ставки: p50 {report['place_p50_us']:.1f} мкс, p99 {report['place_p99_us']:.1f} мкс"
+    )
+    print(
+        f"Запись в БД: {report['batches']} пачек, в среднем {report['mean_batch']:.0f} ставок, "
+        f"остаток очереди записан за {drain:.3f} с"
+    )
+    print(f"В БД {stored['bids']} ставок из {accepted}, ошибок записи {stats['failed']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, ensure_ascii=False, indent=2, sort_keys=True)
+            output.write("\n")
+    if stored["bids"] != accepted or mismatched:
+        raise SystemExit("Записанные ставки не совпадают с принятыми.")
+
+
+if __name__ == "__main__":
+    main()
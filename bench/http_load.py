@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from typing import NamedTuple
+from urllib.parse import urlencode, urlsplit
+
+from bench import git_commit
+from db import AuctionDB
+
+# Маршрут -> (метод, путь, нужен ли период в параметрах).
+ENDPOINTS = {
+    "index": ("GET", "/", False),
+    "auctions": ("GET", "/auctions", True),
+    "auction_revenue": ("GET", "/reports/auction-revenue", False),
+    "sold_items": ("GET", "/reports/sold-items", True),
+    "seller_revenue": ("GET", "/reports/seller-revenue", True),
+    "buyers_in_period": ("GET", "/reports/active-buyers", True),
+    "buyer_counts": ("GET", "/reports/buyer-counts", True),
+    "sellers_participated": ("GET", "/reports/sellers-participated", True),
+    "add_sale": ("POST", "/sales/add", False),
+}
+
+DEFAULT_MIX = {
+    "index": 20,
+    "auctions": 15,
+    "auction_revenue": 5,
+    "sold_items": 15,
+    "seller_revenue": 10,
+    "buyers_in_period": 5,
+    "buyer_counts": 10,
+    "sellers_participated": 5,
+    "add_sale": 5,
+}
+
+
+class Target(NamedTuple):
+    host: str
+    port: int
+    timeout: float
+    period: dict[str, str]
+
+
+class SalePool:
+    """Непроданные предметы и покупатели для POST /sales/add; каждый предмет продаётся один раз."""
+
+    def __init__(self, items: list[int], buyers: list[int]) -> None:
+        self._items = deque(items)
+        self._buyers = buyers
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, size: int, seed: int) -> "SalePool":
+        db = AuctionDB()
+        try:
+            items = [
+                row["id"]
+                for row in db.query("SELECT id FROM items WHERE NOT is_sold LIMIT %s", (size,))
+            ]
+            buyers = [row["id"] for row in db.query("SELECT id FROM participants LIMIT 10000")]
+        finally:
+            db.close()
+        random.Random(seed).shuffle(items)
+        return cls(items, buyers)
+
+    def form(self, rng: random.Random) -> dict | None:
+        with self._lock:
+            if not self._items or not self._buyers:
+                return None
+            item_id = self._items.popleft()
+        return {
+            "item_id": item_id,
+            "buyer_id": rng.choice(self._buyers),
+            "sold_price": f"{rng.uniform(1_000, 500_000):.2f}",
+            "sold_at": datetime.now().strftime("%Y-%m-%dT%H:%M"),
+        }
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(
+                f"Неизвестный маршрут '{name}'. Доступны: {', '.join(ENDPOINTS)}"
+            )
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Некорректный вес маршрута '{name}'")
+    return mix
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * share
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class Worker(threading.Thread):
+    def __init__(
+        self,
+        target: Target,
+        mix: dict[str, float],
+        sales: SalePool | None,
+        seed: int,
+        measure_from: float,
+        deadline: float,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.target = target
+        self.names = list(mix)
+        self.cum_weights = list(accumulate(mix.values()))
+        self.sales = sales
+        self.rng = random.Random(seed)
+        self.measure_from = measure_from
+        self.deadline = deadline
+        # Маршрут -> задержки в секундах, коды ответа, число ошибок.
+        self.latencies: dict[str, list[float]] = {name: [] for name in self.names}
+        self.statuses: dict[str, Counter] = {name: Counter() for name in self.names}
+        self.errors: Counter = Counter()
+        self.skipped = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(
+            self.target.host, self.target.port, timeout=self.target.timeout
+        )
+
+    def run(self) -> None:
+        conn = self._connect()
+        while time.monotonic() < self.deadline:
+            name = self.rng.choices(self.names, cum_weights=self.cum_weights)[0]
+            method, path, with_period = ENDPOINTS[name]
+            body = None
+            headers = {}
+            if with_period:
+                path = f"{path}?{urlencode(self.target.period)}"
+            if method == "POST":
+                form = self.sales.form(self.rng) if self.sales else None
+                if form is None:
+                    self.skipped += 1
+                    continue
+                body = urlencode(form)
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+            started = time.monotonic()
+            begin = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = str(response.status)
+                # Форма продажи при любом исходе отвечает редиректом:
+                # успешная продажа ведёт на список продаж.
+                failed = response.status >= 400 or (
+                    name == "add_sale"
+                    and "/reports/sold-items" not in (response.getheader("Location") or "")
+                )
+            except (OSError, http.client.HTTPException) as exc:
+                status = type(exc).__name__
+                failed = True
+                conn.close()
+                conn = self._connect()
+            elapsed = time.perf_counter() - begin
+
+            if started < self.measure_from:
+                continue
+            self.latencies[name].append(elapsed)
+            self.statuses[name][status] += 1
+            if failed:
+                self.errors[name] += 1
+        conn.close()
+
+
+def build_report(workers: list[Worker], measured: float, config: dict) -> dict:
+    endpoints = {}
+    total_requests = total_errors = 0
+    for name in config["mix"]:
+        latencies = sorted(value for w in workers for value in w.latencies[name])
+        statuses = sum((w.statuses[name] for w in workers), Counter())
+        errors = sum(w.errors[name] for w in workers)
+        total_requests += len(latencies)
+        total_errors += errors
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": round(len(latencies) / measured, 2),
+            "mean_ms": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "p50_ms": round(1000 * percentile(latencies, 0.50), 2),
+            "p95_ms": round(1000 * percentile(latencies, 0.95), 2),
+            "p99_ms": round(1000 * percentile(latencies, 0.99), 2),
+            "max_ms": round(1000 * latencies[-1], 2) if latencies else 0.0,
+            "statuses": dict(sorted(statuses.items())),
+        }
+    return {
+        "commit": git_commit(),
+        "config": config,
+        "measured_seconds": round(measured, 2),
+        "total": {
+            "requests": total_requests,
+            "errors": total_errors,
+            "rps": round(total_requests / measured, 2),
+            "sales_skipped": sum(w.skipped for w in workers),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def run_load(
+    url: str,
+    mix: dict[str, float],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    period: dict[str, str],
+    timeout: float = 30,
+    seed: int = 42,
+    sales: SalePool | None = None,
+) -> dict:
+    """Нагружает приложение по адресу ``url`` и возвращает отчёт (см. ``build_report``)."""
+    parts = urlsplit(url)
+    target = Target(parts.hostname or "127.0.0.1", parts.port or 80, timeout, period)
+    measure_from = time.monotonic() + warmup
+    deadline = measure_from + duration
+    workers = [
+        Worker(target, mix, sales, seed + n, measure_from, deadline) for n in range(concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    config = {
+        "url": url,
+        "concurrency": concurrency,
+        "duration": duration,
+        "warmup": warmup,
+        "mix": mix,
+        "period": period,
+        "seed": seed,
+    }
+    return build_report(workers, duration, config)
+
+
+def report_period(until: date, days: int) -> dict[str, str]:
+    return {"start": (until - timedelta(days=days)).isoformat(), "end": until.isoformat()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный тест HTTP-маршрутов приложения с задержками по перцентилям."
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Адрес приложения")
+    parser.add_argument("--concurrency", type=int, default=8, help="Число параллельных клиентов")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность замера, с")
+    parser.add_argument(
+        "--warmup", type=float, default=5, help="Прогрев перед замером, с (не учитывается)"
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help="Веса маршрутов: index=20,sold_items=10,... (по умолчанию смешанная нагрузка)",
+    )
+    parser.add_argument(
+        "--period-days", type=int, default=30, help="Длина периода для отчётов, дней"
+    )
+    parser.add_argument(
+        "--until",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="Последний день периода отчётов, ГГГГ-ММ-ДД (как --until у seed_data.py)",
+    )
+    parser.add_argument(
+        "--sale-pool",
+        type=int,
+        default=20_000,
+        help="Сколько непроданных предметов выбрать из БД для POST /sales/add",
+    )
+    parser.add_argument("--timeout", type=float, default=30, help="Таймаут запроса, с")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно выбора маршрутов")
+    parser.add_argument("--output", help="Куда записать JSON-отчёт (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    # POST-запросы продают предметы: после замера данные нужно сгенерировать заново.
+    sales = SalePool.load(args.sale_pool, args.seed) if args.mix.get("add_sale") else None
+    report = run_load(
+        args.url,
+        args.mix,
+        args.concurrency,
+        args.duration,
+        args.warmup,
+        report_period(args.until, args.period_days),
+        timeout=args.timeout,
+        seed=args.seed,
+        sales=sales,
+    )
+
+    print(f"{'маршрут':<22} {'запросов':>9} {'ошибок':>7} {'RPS':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    for name, stats in report["endpoints"].items():
+        print(
+            f"{name:<22} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>8.1f} "
+            f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}"
+        )
+    total = report["total"]
+    print(f"Всего: {total['requests']} запросов, {total['errors']} ошибок, {total['rps']:.1f} RPS")
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+from datetime import date, timedelta
+from typing import Any, NamedTuple
+
+import queries
+import seed_data
+from bench import git_commit
+from db import AuctionDB
+from manage_db import plan_scans, table_sizes
+
+# Во сколько раз медианное время может вырасти относительно базового
+# отчёта, прежде чем это считается регрессией.
+TIME_REGRESSION_FACTOR = 1.5
+# Запросы быстрее этого порога не сравниваются по времени: разброс больше самого времени.
+TIME_REGRESSION_MIN_MS = 5.0
+# Запрос -> таблицы, которые он по смыслу читает целиком.
+EXPECTED_SEQ_SCANS = {"auction_revenue": {"auctions"}}
+
+
+class Scale(NamedTuple):
+    participants: int
+    auctions: int
+    items_per_auction: int
+
+
+def parse_scale(text: str) -> Scale:
+    try:
+        participants, auctions, items_per_auction = (int(part) for part in text.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "Масштаб задаётся как участники:аукционы:лотов_в_аукционе, например 10000:1000:100"
+        )
+    return Scale(participants, auctions, items_per_auction)
+
+
+def _search(text: str) -> dict:
+    # Те же параметры, что формирует main._search_params для подстроки.
+    return {"pattern": f"%{text}%", "prefix": f"{text}%", "q": text, "limit": 20}
+
+
+def benchmark_queries(until: date, period_days: int) -> dict[str, tuple[str, Any]]:
+    """Запросы приложения с типичными параметрами: имя -> (SQL, параметры)."""
+    start = (until - timedelta(days=period_days)).isoformat()
+    end = until.isoformat()
+    bounds = queries.period_bounds(start, end)
+    period_sql, period_params = queries.period_filter("s.sold_at", start, end)
+    benchmarks: dict[str, tuple[str, Any]] = {
+        "index_totals": (queries.DASHBOARD_TOTALS_SQL, ()),
+        "index_upcoming": (queries.UPCOMING_AUCTIONS_SQL, ()),
+        "index_top_sellers": (queries.TOP_SELLERS_SQL, ()),
+        "index_batch": (queries.DASHBOARD_BATCH_SQL, ()),
+        "auction_revenue": (queries.AUCTION_REVENUE_SQL, ()),
+        "sold_items_page": (
+            queries.SOLD_ITEMS_PAGE_SQL.format(
+                where=period_sql, order="s.sold_at DESC, s.id DESC"
+            ),
+            [*period_params, 51],
+        ),
+        "unsold_items_search": (queries.SEARCH_UNSOLD_ITEMS_SQL, _search("ваза")),
+        "participants_search": (queries.SEARCH_PARTICIPANTS_SQL, _search("иванов")),
+        "auctions_search": (queries.SEARCH_AUCTIONS_SQL, _search("торги")),
+        "items_fulltext_search": (
+            queries.ITEM_SEARCH_SQL.format(where="TRUE"),
+            ["фарфор ваза", 50],
+        ),
+    }
+    for name, sql in queries.PERIOD_REPORTS.items():
+        benchmarks[name] = (sql, bounds)
+    return benchmarks
+
+
+def explain(db: AuctionDB, sql: str, params: Any) -> dict:
+    result = db.get(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)["QUERY PLAN"]
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]
+
+
+def measure(
+    db: AuctionDB, name: str, sql: str, params: Any, repeat: int, sizes: dict
+) -> dict:
+    runs = [explain(db, sql, params) for _ in range(repeat)]
+    times = [run["Execution Time"] for run in runs]
+    # Буферы берутся из последнего (прогретого) запуска.
+    plan = runs[-1]["Plan"]
+    scans, seq_scans = plan_scans(plan, sizes)
+    seq_scans = [table for table in seq_scans if table not in EXPECTED_SEQ_SCANS.get(name, ())]
+    return {
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "planning_ms": round(runs[-1]["Planning Time"], 3),
+        "rows": plan["Actual Rows"],
+        "shared_hit_blocks": plan.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": plan.get("Shared Read Blocks", 0),
+        "temp_written_blocks": plan.get("Temp Written Blocks", 0),
+        "plan": scans,
+        "seq_scans": seq_scans,
+    }
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """Сравнивает отчёт с базовым по совпадающим масштабам и запросам."""
+    problems = []
+    baseline_runs = {run["scale_label"]: run for run in baseline.get("runs", [])}
+    for run in current["runs"]:
+        before = baseline_runs.get(run["scale_label"])
+        if before is None:
+            continue
+        for name, stats in run["queries"].items():
+            old = before["queries"].get(name)
+            if old is None:
+                continue
+            where = f"{run['scale_label']} / {name}"
+            new_scans = sorted(set(stats["plan"]) - set(old["plan"]))
+            if new_scans:
+                problems.append(f"{where}: план изменился, появилось {', '.join(new_scans)}")
+            if (
+                stats["median_ms"] >= TIME_REGRESSION_MIN_MS
+                and stats["median_ms"] > old["median_ms"] * TIME_REGRESSION_FACTOR
+            ):
+                problems.append(
+                    f"{where}: время {old['median_ms']:.1f} → {stats['median_ms']:.1f} мс"
+                )
+    return problems
+
+
+def run_scale(db: AuctionDB, label: str, benchmarks: dict, repeat: int) -> dict:
+    sizes = table_sizes(db)
+    results = {}
+    print(f"== {label}: " + ", ".join(f"{name} ≈ {int(rows)}" for name, rows in sorted(sizes.items())))
+    print(f"{'запрос':<24} {'медиана, мс':>12} {'hit':>9} {'read':>9}  план")
+    for name, (sql, params) in benchmarks.items():
+        stats = measure(db, name, sql, params, repeat, sizes)
+        results[name] = stats
+        flag = "  SEQ SCAN: " + ", ".join(stats["seq_scans"]) if stats["seq_scans"] else ""
+        print(
+            f"{name:<24} {stats['median_ms']:>12.2f} {stats['shared_hit_blocks']:>9} "
+            f"{stats['shared_read_blocks']:>9}  {'; '.join(stats['plan'])}{flag}"
+        )
+    return {"scale_label": label, "table_rows": sizes, "queries": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Замер SQL-запросов приложения через EXPLAIN (ANALYZE, BUFFERS): время, "
+            "буферы и способы доступа к таблицам, с поиском последовательных сканирований."
+        )
+    )
+    parser.add_argument(
+        "--scale",
+        type=parse_scale,
+        action="append",
+        help=(
+            "Сгенерировать данные заданного объёма (участники:аукционы:лотов_в_аукционе) и "
+            "замерить на них; можно указать несколько раз. ДАННЫЕ В БД УДАЛЯЮТСЯ. "
+            "Без параметра замер выполняется на текущих данных."
+        ),
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Сколько раз выполнять каждый запрос")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора данных")
+    parser.add_argument(
+        "--until",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="Дата отсчёта данных и периода отчётов, ГГГГ-ММ-ДД (по умолчанию сегодня)",
+    )
+    parser.add_argument("--period-days", type=int, default=30, help="Длина периода отчётов, дней")
+    parser.add_argument("--baseline", help="JSON-отчёт предыдущего запуска для сравнения")
+    parser.add_argument("--output", help="Куда записать JSON-отчёт")
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Завершиться с ошибкой при последовательном сканировании большой таблицы "
+        "или регрессии относительно --baseline.",
+    )
+    args = parser.parse_args()
+
+    benchmarks = benchmark_queries(args.until, args.period_days)
+    report: dict = {"commit": git_commit(), "repeat": args.repeat, "runs": []}
+    db = AuctionDB()
+    try:
+        if not args.scale:
+            report["runs"].append(run_scale(db, "current", benchmarks, args.repeat))
+        for scale in args.scale or []:
+            options = seed_data.ScaleOptions(
+                participants=scale.participants,
+                auctions=scale.auctions,
+                items_per_auction=scale.items_per_auction,
+                sell_through=0.7,
+                seed=args.seed,
+                zipf=1.1,
+                years=3,
+                until=args.until,
+            )
+            seed_data.generate(db, options)
+            label = f"{scale.participants}:{scale.auctions}:{scale.items_per_auction}"
+            report["runs"].append(run_scale(db, label, benchmarks, args.repeat))
+    finally:
+        db.close()
+
+    problems = [
+        f"{run['scale_label']} / {name}: SEQ SCAN {', '.join(stats['seq_scans'])}"
+        for run in report["runs"]
+        for name, stats in run["queries"].items()
+        if stats["seq_scans"]
+    ]
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline:
+            problems.extend(compare(report, json.load(baseline)))
+    report["problems"] = problems
+    for problem in problems:
+        print(f"! {problem}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, ensure_ascii=False, indent=2, sort_keys=True)
+            output.write("\n")
+    if args.strict and problems:
+        raise SystemExit(f"Найдено проблем: {len(problems)}.")
+
+
+if __name__ == "__main__":
+    main()
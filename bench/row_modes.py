@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import queries
+from db import ROW_FACTORIES, AuctionDB
+
+# Строки той же формы, что и отчёт sold_items, без необходимости заполнять БД.
+SYNTHETIC_SOLD_ITEMS_SQL = """
+    SELECT 'Лот ' || g AS title,
+           g::text AS lot_number,
+           'Аукцион ' || (g % 1000) AS auction_name,
+           (g % 100000)::numeric(12, 2) AS sold_price,
+           timestamp '2020-01-01' + g * interval '1 minute' AS sold_at,
+           'Покупатель ' || (g % 5000) AS buyer_name
+    FROM generate_series(1, %s) AS g
+"""
+
+
+def measure(db: AuctionDB, sql: str, params: list, mode: str) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = db.query(sql, params, row_factory=mode)
+    elapsed = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(rows)
+    del rows
+    return {
+        "mode": mode,
+        "rows": count,
+        "seconds": elapsed,
+        "retained_mb": retained / 2**20,
+        "peak_mb": peak / 2**20,
+        "bytes_per_row": retained / count if count else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Сравнение памяти и времени выборки для режимов строк AuctionDB."
+    )
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Сколько строк выбирать")
+    parser.add_argument(
+        "--source",
+        choices=["synthetic", "sales"],
+        default="synthetic",
+        help="synthetic — строки из generate_series, sales — реальный отчёт sold_items",
+    )
+    args = parser.parse_args()
+
+    if args.source == "sales":
+        sql = f"{queries.SOLD_ITEMS_SQL} LIMIT %s"
+        params = [*queries.period_bounds("1900-01-01", "2999-12-31"), args.rows]
+    else:
+        sql = SYNTHETIC_SOLD_ITEMS_SQL
+        params = [args.rows]
+
+    db = AuctionDB()
+    try:
+        print(f"{'режим':<8} {'строк':>9} {'время, с':>9} {'память, МБ':>11} {'пик, МБ':>9} {'байт/строка':>12}")
+        for mode in ROW_FACTORIES:
+            result = measure(db, sql, params, mode)
+            print(
+                f"{result['mode']:<8} {result['rows']:>9} {result['seconds']:>9.2f} "
+                f"{result['retained_mb']:>11.1f} {result['peak_mb']:>9.1f} "
+                f"{result['bytes_per_row']:>12.0f}"
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
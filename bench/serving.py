@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from datetime import date
+
+from bench import git_commit
+from bench.http_load import DEFAULT_MIX, parse_mix, report_period, run_load
+
+
+def parse_server(text: str) -> tuple[str, int, int]:
+    """
+    ``dev`` — сервер разработки Flask, ``gunicorn:W:T`` — W воркеров по T
+    потоков, ``uvicorn:W:T`` — ASGI-приложение (asgi.py) в W процессах с
+    T потоками для Flask-маршрутов.
+    """
+    if text == "dev":
+        return "dev", 1, 1
+    kind, _, rest = text.partition(":")
+    try:
+        workers, threads = (int(part) for part in rest.split(":"))
+    except ValueError:
+        workers = threads = 0
+    if kind not in ("gunicorn", "uvicorn") or workers < 1 or threads < 1:
+        raise argparse.ArgumentTypeError(
+            "Сервер задаётся как dev, gunicorn:воркеры:потоки или uvicorn:воркеры:потоки"
+        )
+    return kind, workers, threads
+
+
+def label(server: tuple[str, int, int]) -> str:
+    kind, workers, threads = server
+    return "dev" if kind == "dev" else f"{kind}:{workers}:{threads}"
+
+
+def start_server(
+    server: tuple[str, int, int], port: int, env: dict[str, str] | None = None
+) -> subprocess.Popen:
+    kind, workers, threads = server
+    env = {**os.environ, **(env or {}), "PORT": str(port), "FLASK_ENV": "production"}
+    if kind == "dev":
+        command = [sys.executable, "main.py"]
+    elif kind == "gunicorn":
+        env.update(WEB_WORKERS=str(workers), WEB_THREADS=str(threads))
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"]
+    else:
+        env.update(WEB_THREADS=str(threads))
+        command = [
+            sys.executable, "-m", "uvicorn", "asgi:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--no-access-log",
+        ]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(port: int, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Сервер завершился с кодом {process.returncode} до начала замера.")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health/pool")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"Сервер не ответил за {timeout:g} с.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Сравнение пропускной способности сервера разработки Flask и gunicorn "
+            "с разным числом воркеров и потоков на одной и той же нагрузке."
+        )
+    )
+    cpus = multiprocessing.cpu_count()
+    parser.add_argument(
+        "--server",
+        type=parse_server,
+        action="append",
+        help=f"dev, gunicorn:воркеры:потоки или uvicorn:воркеры:потоки; можно несколько (по умолчанию dev, "
+        f"gunicorn:1:4 и gunicorn:{cpus}:4)",
+    )
+    parser.add_argument("--port", type=int, default=5055, help="Порт для запускаемого сервера")
+    parser.add_argument("--concurrency", type=int, default=32, help="Число параллельных клиентов")
+    parser.add_argument("--duration", type=float, default=20, help="Длительность замера, с")
+    parser.add_argument("--warmup", type=float, default=3, help="Прогрев, с")
+    # По умолчанию только чтение, чтобы замеры разных серверов шли на одинаковых данных.
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default={name: weight for name, weight in DEFAULT_MIX.items() if name != "add_sale"},
+        help="Веса маршрутов, как у bench.http_load (по умолчанию без POST)",
+    )
+    parser.add_argument("--period-days", type=int, default=30, help="Длина периода отчётов, дней")
+    parser.add_argument(
+        "--until", type=date.fromisoformat, default=date.today(), help="Последний день периода"
+    )
+    parser.add_argument("--output", help="Куда записать JSON-отчёт")
+    args = parser.parse_args()
+    if "add_sale" in args.mix:
+        parser.error("POST /sales/add меняет данные между замерами; уберите его из --mix.")
+
+    servers = args.server or [("dev", 1, 1), ("gunicorn", 1, 4), ("gunicorn", cpus, 4)]
+    period = report_period(args.until, args.period_days)
+    results = {}
+    for server in servers:
+        process = start_server(server, args.port)
+        try:
+            wait_ready(args.port, process)
+            report = run_load(
+                f"http://127.0.0.1:{args.port}",
+                args.mix,
+                args.concurrency,
+                args.duration,
+                args.warmup,
+                period,
+            )
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+        results[label(server)] = report
+        total = report["total"]
+        slowest = max(report["endpoints"].values(), key=lambda stats: stats["p95_ms"])
+        print(
+            f"{label(server):<16} {total['rps']:>9.1f} RPS  ошибок: {total['errors']:<6} "
+            f"худший p95: {slowest['p95_ms']:.1f} мс"
+        )
+
+    baseline = next(iter(results.values()))["total"]["rps"]
+    for name, report in results.items():
+        if baseline:
+            print(f"{name:<16} × {report['total']['rps'] / baseline:.2f} к {label(servers[0])}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(
+                {"commit": git_commit(), "cpu_count": cpus, "servers": results},
+                output,
+                ensure_ascii=False,
+                indent=2,
+                sort_keys=True,
+            )
+            output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
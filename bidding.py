@@ -0,0 +1,613 @@
+"""
+Приём ставок на лоты.
+
+Текущая ставка каждого лота хранится в памяти процесса (``LotBook``), поэтому
+проверка новой ставки — сравнение с числом под блокировкой лота, без запроса
+к БД. Принятые ставки складываются в очередь, и отдельный поток дописывает
+их в таблицу ``bids`` пачками (``BidWriter``).
+
+Книга ставок своя в каждом процессе, поэтому торги по лоту ведёт один
+процесс: загружая лот в память, книга захватывает его advisory-блокировкой
+сеанса, и ставки на лот, захваченный другим процессом, не принимаются
+(см. README, раздел «Ставки»). Ставка считается принятой до записи в БД; при
+аварийном завершении процесса теряются ещё не записанные ставки.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, NamedTuple
+
+import psycopg2
+
+import queries
+from db import AuctionDB
+from events import get_event_hub
+
+log = logging.getLogger(__name__)
+
+CENT = Decimal("0.01")
+# Первая половина ключа advisory-блокировки лота (вторая — id лота); см. также
+# migrations.MIGRATION_LOCK_KEY.
+LOT_LOCK_KEY = 7_352_002
+# Наибольшее значение колонки bids.amount NUMERIC(12, 2).
+MAX_AMOUNT = Decimal("9999999999.99")
+
+
+class LotNotFound(LookupError):
+    """Лот или участник торгов не найден."""
+
+
+class BidRejected(Exception):
+    """Ставка не принята; ``minimum`` — наименьшая допустимая ставка, если торги открыты."""
+
+    def __init__(self, message: str, minimum: Decimal | None = None) -> None:
+        super().__init__(message)
+        self.minimum = minimum
+
+
+class LotBusy(Exception):
+    """Торги по лоту ведёт другой процесс."""
+
+
+class _Evicted(Exception):
+    """Лот вытеснен из памяти, пока ставка ждала его блокировку: его нужно загрузить заново."""
+
+
+class Bid(NamedTuple):
+    item_id: int
+    bidder_id: int
+    amount: Decimal
+    placed_at: datetime
+
+
+class LotBook:
+    """Состояние торгов по одному лоту; поля меняются только под ``lock``."""
+
+    __slots__ = (
+        "item_id",
+        "seller_id",
+        "start_price",
+        "high_bid",
+        "high_bidder_id",
+        "closed",
+        "owned",
+        "evicted",
+        "pending",
+        "accepted",
+        "rejected",
+        "lock",
+    )
+
+    def __init__(self, row: dict) -> None:
+        self.item_id: int = row["id"]
+        self.seller_id: int = row["seller_id"]
+        self.start_price: Decimal = row["start_price"]
+        self.high_bid: Decimal | None = row["high_bid"]
+        self.high_bidder_id: int | None = row["high_bidder_id"]
+        self.closed: bool = row["is_sold"]
+        # Лот захвачен этим процессом и хранится в книге ставок.
+        self.owned = False
+        self.evicted = False
+        # Принятые ставки, ещё не записанные в БД.
+        self.pending = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def minimum(self, increment: Decimal) -> Decimal:
+        return self.start_price if self.high_bid is None else self.high_bid + increment
+
+    def place(self, bidder_id: int, amount: Decimal, increment: Decimal) -> Bid:
+        with self.lock:
+            if self.evicted:
+                raise _Evicted()
+            if self.closed:
+                self.rejected += 1
+                raise BidRejected("Торги по лоту закрыты.")
+            minimum = self.minimum(increment)
+            if amount < minimum:
+                self.rejected += 1
+                raise BidRejected(f"Ставка должна быть не меньше {minimum}.", minimum)
+            self.high_bid = amount
+            self.high_bidder_id = bidder_id
+            self.pending += 1
+            self.accepted += 1
+        return Bid(self.item_id, bidder_id, amount, datetime.now())
+
+
+def _done(entries: list[tuple[Bid, LotBook]]) -> None:
+    for _, lot in entries:
+        with lot.lock:
+            lot.pending -= 1
+
+
+class BidWriter(threading.Thread):
+    """
+    Дописывает принятые ставки в БД: пачка уходит, когда набралось
+    ``batch_size`` ставок или прошло ``flush_interval`` секунд с первой
+    ставки в пачке.
+
+    У потока своё подключение, не из пула запросов: запись не ждёт свободного
+    подключения. При обрыве подключения, перезапуске БД или таймауте запроса
+    пачка остаётся в памяти, а запись повторяется через новое подключение с
+    паузой, растущей до ``max_retry_delay`` секунд.
+
+    В том же подключении книга держит блокировки своих лотов (``claim``).
+    Блокировки сеанса пропадают вместе с подключением, поэтому без ставок
+    поток раз в ``keepalive`` секунд проверяет подключение, а после
+    переподключения захватывает лоты заново; лоты, которые успел захватить
+    другой процесс, передаются в ``on_lost``.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_retry_delay: float = 5.0,
+        keepalive: float = 5.0,
+        on_lost: Callable[[list[int]], None] | None = None,
+    ) -> None:
+        super().__init__(name="bid-writer", daemon=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        self.keepalive = keepalive
+        self.on_lost = on_lost
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self._queue: queue.Queue[tuple[Bid, LotBook] | None] = queue.Queue()
+        self._db: AuctionDB | None = None
+        # Подключение нужно и потоку записи, и запросам (claim, release).
+        self._db_lock = threading.Lock()
+        self._claimed: set[int] = set()
+
+    def put(self, bid: Bid, lot: LotBook) -> None:
+        self._queue.put((bid, lot))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self) -> None:
+        """Ждёт, пока все поставленные в очередь ставки будут записаны."""
+        self._queue.join()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._queue.put(None)
+        self.join(timeout)
+
+    def run(self) -> None:
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.keepalive)
+            except queue.Empty:
+                self._check()
+                continue
+            if first is None:
+                self._queue.task_done()
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(entry)
+            size = len(batch)
+            try:
+                self._write_retrying(batch)
+            except Exception:
+                self.failed += len(batch)
+                log.exception("Не удалось записать %s ставок", len(batch))
+                _done(batch)
+            finally:
+                for _ in range(size):
+                    self._queue.task_done()
+        with self._db_lock:
+            self._disconnect()
+
+    def claim(self, item_id: int) -> bool:
+        """Захватывает лот для этого процесса; ``False`` — лот захвачен другим процессом."""
+        with self._db_lock:
+            if item_id in self._claimed:
+                return True
+            try:
+                locked = self._try_lock(self._connection(), item_id)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # Подключение оборвалось, пока не было ставок: одна повторная попытка.
+                self._disconnect()
+                locked = self._try_lock(self._connection(), item_id)
+            if locked:
+                self._claimed.add(item_id)
+            return locked
+
+    def release(self, item_id: int) -> None:
+        with self._db_lock:
+            if item_id not in self._claimed:
+                return
+            self._claimed.discard(item_id)
+            if self._db is None:
+                return
+            try:
+                self._db.get("SELECT pg_advisory_unlock(%s, %s)", (LOT_LOCK_KEY, item_id))
+                self._db.conn.commit()
+            except psycopg2.Error:
+                # Вместе с подключением пропадут и остальные блокировки: их
+                # заново захватит _connection.
+                self._disconnect()
+
+    def open_lots(self, item_ids: list[int]) -> set[int]:
+        """Какие из лотов ещё не проданы и не удалены (по данным БД)."""
+        with self._db_lock:
+            db = self._connection()
+            rows = db.query(
+                "SELECT id FROM items WHERE id = ANY(%s) AND NOT is_sold", (item_ids,)
+            )
+            db.conn.commit()
+        return {row["id"] for row in rows}
+
+    @staticmethod
+    def _try_lock(db: AuctionDB, item_id: int) -> bool:
+        row = db.get(
+            "SELECT pg_try_advisory_lock(%s, %s) AS locked", (LOT_LOCK_KEY, item_id)
+        )
+        db.conn.commit()
+        return row["locked"]
+
+    def _connection(self) -> AuctionDB:
+        # Вызывается под self._db_lock.
+        if self._db is None:
+            self._db = AuctionDB()
+            lost = [item_id for item_id in self._claimed if not self._try_lock(self._db, item_id)]
+            if lost:
+                log.error("Лоты %s захвачены другим процессом после переподключения", lost)
+                self._claimed.difference_update(lost)
+                if self.on_lost is not None:
+                    self.on_lost(lost)
+        return self._db
+
+    def _check(self) -> None:
+        with self._db_lock:
+            if not self._claimed:
+                return
+            try:
+                self._connection().get("SELECT 1")
+                self._db.conn.commit()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as exc:
+                log.warning("Подключение книги ставок недоступно: %s", str(exc).strip())
+                self._disconnect()
+
+    def _disconnect(self) -> None:
+        if self._db is None:
+            return
+        try:
+            self._db.close()
+        except psycopg2.Error:
+            pass
+        self._db = None
+
+    def _write_retrying(self, batch: list[tuple[Bid, LotBook]]) -> None:
+        delay = 0.1
+        while True:
+            try:
+                with self._db_lock:
+                    self._write(batch)
+                return
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as exc:
+                self.retries += 1
+                log.warning(
+                    "Не удалось записать %s ставок (%s), повтор через %g с",
+                    len(batch),
+                    str(exc).strip(),
+                    delay,
+                )
+                with self._db_lock:
+                    self._disconnect()
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def _write(self, batch: list[tuple[Bid, LotBook]]) -> None:
+        # Записанные и отброшенные ставки удаляются из batch, поэтому после
+        # обрыва посреди записи по одной повтор не продублирует их.
+        db = self._connection()
+        try:
+            db.executemany(queries.INSERT_BIDS_SQL, [bid for bid, _ in batch])
+        except (psycopg2.IntegrityError, psycopg2.DataError):
+            # Лот или участник удалены, пока ставка ждала в очереди:
+            # записываем остальные ставки пачки по одной.
+            while batch:
+                bid = batch[0][0]
+                try:
+                    db.executemany(queries.INSERT_BIDS_SQL, [bid])
+                    self.written += 1
+                except (psycopg2.IntegrityError, psycopg2.DataError) as exc:
+                    self.failed += 1
+                    log.error("Ставка %s не записана: %s", bid, exc)
+                _done(batch[:1])
+                del batch[0]
+        else:
+            self.written += len(batch)
+            _done(batch)
+            batch.clear()
+        self.batches += 1
+
+
+class BidBook:
+    """
+    Книга ставок процесса: лоты загружаются из БД при первой ставке или
+    запросе состояния и дальше проверяются только в памяти.
+
+    ``increment`` — минимальный шаг ставки; первая ставка должна быть не
+    меньше стартовой цены лота. В памяти хранятся только открытые лоты,
+    захваченные этим процессом, не больше ``max_lots``: давно не
+    использованные вытесняются (и освобождаются), когда все их ставки
+    записаны в БД.
+    """
+
+    def __init__(
+        self,
+        increment: Decimal,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        max_lots: int = 10000,
+    ) -> None:
+        if increment <= 0:
+            raise ValueError("Шаг ставки должен быть положительным.")
+        self.increment = increment
+        self.max_lots = max_lots
+        self._lots: OrderedDict[int, LotBook] = OrderedDict()
+        # Счётчики ставок лотов, уже удалённых из памяти.
+        self._retired_accepted = 0
+        self._retired_rejected = 0
+        self._bidders: set[int] = set()
+        self._lock = threading.Lock()
+        # Захват и освобождение лотов по очереди: иначе освобождение
+        # вытесненного лота могло бы снять блокировку, только что
+        # подтверждённую для этого же лота другим потоком.
+        self._claim_lock = threading.Lock()
+        self.writer = BidWriter(batch_size, flush_interval, on_lost=self._drop_lots)
+        self.writer.start()
+
+    def lot(self, item_id: int, get_db: Callable[[], AuctionDB]) -> LotBook:
+        """
+        Возвращает состояние лота. ``get_db`` вызывается, только если лот
+        ещё не загружен в память. Проданный лот и лот, захваченный другим
+        процессом, возвращаются из БД без сохранения в книге (``owned`` ложно).
+        """
+        with self._lock:
+            lot = self._lots.get(item_id)
+            if lot is not None:
+                self._lots.move_to_end(item_id)
+                return lot
+        row = get_db().get(queries.LOT_STATE_SQL, (item_id,))
+        if row is None:
+            raise LotNotFound("Лот не найден.")
+        if row["is_sold"]:
+            # Проданный лот больше не меняется: в памяти его не держим.
+            return LotBook(row)
+        with self._claim_lock:
+            if not self.writer.claim(item_id):
+                return LotBook(row)
+            with self._lock:
+                lot = self._lots.get(item_id)
+            if lot is None:
+                # Строка прочитана до захвата: за это время прежний владелец
+                # мог дописать ставки и отпустить лот. Перечитываем под блокировкой.
+                row = get_db().get(queries.LOT_STATE_SQL, (item_id,))
+                if row is None or row["is_sold"]:
+                    self.writer.release(item_id)
+                    if row is None:
+                        raise LotNotFound("Лот не найден.")
+                    return LotBook(row)
+            with self._lock:
+                lot = self._lots.get(item_id)
+                if lot is None:
+                    lot = self._lots[item_id] = LotBook(row)
+                    lot.owned = True
+                self._lots.move_to_end(item_id)
+                victims = self._evict(keep=item_id)
+            for victim in victims:
+                self.writer.release(victim.item_id)
+        return lot
+
+    def _evict(self, keep: int) -> list[LotBook]:
+        # Вызывается под self._lock. Лот с незаписанными ставками остаётся в
+        # памяти: в БД его текущей ставки ещё нет.
+        excess = len(self._lots) - self.max_lots
+        if excess <= 0:
+            return []
+        victims = []
+        for lot in self._lots.values():
+            if len(victims) >= excess:
+                break
+            if lot.item_id == keep:
+                continue
+            with lot.lock:
+                if lot.pending == 0:
+                    lot.evicted = True
+                    victims.append(lot)
+        for lot in victims:
+            self._retire(lot)
+        return victims
+
+    def _retire(self, lot: LotBook) -> None:
+        # Вызывается под self._lock.
+        del self._lots[lot.item_id]
+        self._retired_accepted += lot.accepted
+        self._retired_rejected += lot.rejected
+
+    def _check_bidder(self, bidder_id: int, get_db: Callable[[], AuctionDB]) -> None:
+        if bidder_id in self._bidders:
+            return
+        if get_db().get("SELECT 1 AS found FROM participants WHERE id = %s", (bidder_id,)) is None:
+            raise LotNotFound("Участник не найден.")
+        with self._lock:
+            self._bidders.add(bidder_id)
+
+    def place(
+        self,
+        item_id: int,
+        bidder_id: int,
+        amount: Decimal,
+        get_db: Callable[[], AuctionDB],
+    ) -> Bid:
+        """
+        Принимает ставку или выбрасывает ``BidRejected``; принятая ставка
+        ставится в очередь на запись в БД.
+        """
+        self._check_bidder(bidder_id, get_db)
+        while True:
+            lot = self.lot(item_id, get_db)
+            if not lot.owned and not lot.closed:
+                raise LotBusy("Торги по лоту ведёт другой процесс.")
+            if bidder_id == lot.seller_id:
+                raise BidRejected("Продавец не может делать ставки на свой лот.")
+            try:
+                bid = lot.place(bidder_id, amount.quantize(CENT), self.increment)
+            except _Evicted:
+                continue
+            self.writer.put(bid, lot)
+            return bid
+
+    def close_lot(self, item_id: int) -> None:
+        """Закрывает торги по лоту (например, после продажи)."""
+        with self._claim_lock:
+            with self._lock:
+                lot = self._lots.get(item_id)
+                if lot is not None:
+                    self._retire(lot)
+            if lot is not None:
+                with lot.lock:
+                    lot.closed = True
+                self.writer.release(item_id)
+
+    def _drop_lots(self, item_ids: list[int]) -> None:
+        # Лоты перешли к другому процессу (см. BidWriter.on_lost): следующая
+        # ставка загрузит лот заново и получит LotBusy.
+        with self._lock:
+            for item_id in item_ids:
+                lot = self._lots.get(item_id)
+                if lot is None:
+                    continue
+                with lot.lock:
+                    lot.evicted = True
+                self._retire(lot)
+
+    def resync(self) -> None:
+        """
+        Перечитывает лоты после возможной потери событий: лоты без
+        незаписанных ставок удаляются из памяти и при следующем обращении
+        загрузятся из БД, у остальных проверяется, что они ещё не проданы.
+        """
+        with self._claim_lock:
+            with self._lock:
+                dropped = []
+                for lot in list(self._lots.values()):
+                    with lot.lock:
+                        if lot.pending:
+                            continue
+                        lot.evicted = True
+                    self._retire(lot)
+                    dropped.append(lot.item_id)
+                kept = list(self._lots)
+            for item_id in dropped:
+                self.writer.release(item_id)
+        if kept:
+            still_open = self.writer.open_lots(kept)
+            for item_id in kept:
+                if item_id not in still_open:
+                    self.close_lot(item_id)
+
+    def on_event(self, event: dict) -> None:
+        """
+        Закрывает торги по лотам, проданным или удалённым любым процессом, и
+        перечитывает лоты по событию ``resync`` (см. events.py).
+        """
+        if event["type"] == "resync":
+            self.resync()
+        elif event["type"] == "sale":
+            self.close_lot(event["item_id"])
+        elif event["type"] in ("sales", "lots_closed"):
+            for item_id in event["item_ids"]:
+                self.close_lot(item_id)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lots = list(self._lots.values())
+            accepted = self._retired_accepted + sum(lot.accepted for lot in lots)
+            rejected = self._retired_rejected + sum(lot.rejected for lot in lots)
+        return {
+            "lots": len(lots),
+            "accepted": accepted,
+            "rejected": rejected,
+            "pending": self.writer.pending(),
+            "written": self.writer.written,
+            "failed": self.writer.failed,
+            "batches": self.writer.batches,
+            "retries": self.writer.retries,
+        }
+
+    def close(self) -> None:
+        """Дописывает оставшиеся ставки и останавливает поток записи."""
+        if self.writer.is_alive():
+            self.writer.stop(timeout=30)
+
+
+_book: BidBook | None = None
+_book_pid: int | None = None
+_book_lock = threading.Lock()
+
+
+def close_lot(item_id: int) -> None:
+    """
+    Закрывает торги по лоту в книге ставок процесса, если она уже создана.
+    Книга, которой ещё нет, лот не держит, и создавать её (с потоком записи
+    и приёмником событий) ради этого не нужно.
+    """
+    if _book is not None and _book_pid == os.getpid():
+        _book.close_lot(item_id)
+
+
+def get_bid_book() -> BidBook:
+    """
+    Возвращает книгу ставок процесса, создавая её при первом вызове.
+
+    Настройки берутся из переменных окружения:
+    - BID_INCREMENT (по умолчанию: 100) — минимальный шаг ставки;
+    - BID_BATCH_SIZE (по умолчанию: 500) — сколько ставок записывать за раз;
+    - BID_FLUSH_INTERVAL (по умолчанию: 0.05) — сколько секунд ставка может
+      ждать записи в БД;
+    - BID_MAX_LOTS (по умолчанию: 10000) — сколько открытых лотов держать в памяти.
+    """
+    global _book, _book_pid
+    if _book is None or _book_pid != os.getpid():
+        with _book_lock:
+            if _book is None or _book_pid != os.getpid():
+                _book = BidBook(
+                    Decimal(os.getenv("BID_INCREMENT", "100")),
+                    batch_size=int(os.getenv("BID_BATCH_SIZE", "500")),
+                    flush_interval=float(os.getenv("BID_FLUSH_INTERVAL", "0.05")),
+                    max_lots=int(os.getenv("BID_MAX_LOTS", "10000")),
+                )
+                _book_pid = os.getpid()
+                atexit.register(_book.close)
+                get_event_hub().add_listener(_book.on_event)
+    return _book
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+
+class ReferenceCache:
+    """
+    Кэш справочных списков (аукционы, участники и т. п.) внутри процесса.
+
+    Запись считается актуальной, пока не истёк ``ttl`` и не изменилась
+    версия ни одной из таблиц, от которых она зависит. Версия таблицы
+    увеличивается вызовом ``invalidate`` после записи в неё через приложение;
+    изменения в обход приложения (или в других процессах) видны не позже
+    чем через ``ttl`` секунд.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._versions: dict[str, int] = {}
+        # ключ -> (момент загрузки, версии таблиц при загрузке, значение)
+        self._entries: dict[str, tuple[float, tuple[int, ...], Any]] = {}
+
+    def _snapshot(self, tables: Iterable[str]) -> tuple[int, ...]:
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def get(self, key: str, tables: tuple[str, ...], loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            versions = self._snapshot(tables)
+            entry = self._entries.get(key)
+            if (
+                entry is not None
+                and entry[1] == versions
+                and time.monotonic() - entry[0] < self.ttl
+            ):
+                return entry[2]
+        value = loader()
+        with self._lock:
+            # Если таблицы изменились во время загрузки, значение не сохраняется.
+            if self._snapshot(tables) == versions:
+                self._entries[key] = (time.monotonic(), versions, value)
+        return value
+
+    def invalidate(self, *tables: str) -> None:
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -44,6 +44,10 @@ except Exception as e:
   sleep 1
 done
 
+# Применяем миграции схемы один раз при развёртывании
+echo "Применение миграций..."
+python3 manage_db.py migrate
+
 # Заполняем базу данных только если она пустая
 echo "Проверка наличия данных в базе данных..."
 count=$(python3 -c "
@@ -73,6 +77,16 @@ else
     echo "База данных уже содержит данные ($count участников). Пропускаем заполнение."
 fi
 
-# Запускаем Flask приложение
-echo "Запуск Flask приложения..."
-exec python3 main.py
+# Запускаем приложение: сервер разработки Flask только при FLASK_ENV=development,
+# иначе gunicorn (настройки в gunicorn.conf.py, SIGHUP — плавный перезапуск воркеров)
+if [ "$FLASK_ENV" = "development" ]; then
+    echo "Запуск сервера разработки Flask..."
+    exec python3 main.py
+fi
+# WEB_ASGI=1 — ASGI-приложение (asgi.py): асинхронные выгрузки отчётов и поток событий
+if [ "$WEB_ASGI" = "1" ]; then
+    echo "Запуск uvicorn..."
+    exec uvicorn asgi:app --host 0.0.0.0 --port "${PORT:-5000}" --workers "${WEB_WORKERS:-$(nproc)}"
+fi
+echo "Запуск gunicorn..."
+exec gunicorn -c gunicorn.conf.py main:app
@@ -0,0 +1,367 @@
+"""
+События торгов для подписчиков (Server-Sent Events).
+
+Триггеры (миграция 13) отправляют ``NOTIFY auction_events`` с JSON-объектом
+события. В каждом процессе одно выделенное подключение слушает канал
+(``EventHub``) и раздаёт события подписчикам своего аукциона, поэтому
+нагрузка на БД не зависит от числа подписчиков.
+
+Каждое событие получает номер ``<токен процесса>-<порядковый номер>``. По
+заголовку ``Last-Event-ID`` переподключившийся клиент получает пропущенные
+события из буфера последних событий; если их там уже нет (или клиент попал
+в другой процесс), вместо них приходит событие ``resync``: состояние нужно
+перечитать.
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Iterator, NamedTuple
+
+import psycopg2
+
+from db import connect
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "auction_events"
+# Через сколько миллисекунд браузер переподключается после обрыва.
+RETRY_MS = 3000
+
+
+class TooManySubscribers(Exception):
+    """Достигнут предел подписчиков процесса."""
+
+
+class Event(NamedTuple):
+    seq: int
+    auction_id: int
+    type: str
+    # Исходный JSON из NOTIFY: отправляется клиентам без повторной сериализации.
+    data: str
+
+
+class Subscription:
+    """Очередь событий одного подписчика; при переполнении события заменяются на ``resync``."""
+
+    def __init__(self, auction_id: int, max_queue: int) -> None:
+        self.auction_id = auction_id
+        self.max_queue = max_queue
+        self._events: deque[Event] = deque()
+        self._cond = threading.Condition()
+        self._overflow: Event | None = None
+
+    def push(self, event: Event) -> None:
+        with self._cond:
+            if self._overflow is not None:
+                self._overflow = event
+            elif len(self._events) >= self.max_queue:
+                # Клиент не успевает читать: хвост отбрасывается, клиент перечитает состояние.
+                self._events.clear()
+                self._overflow = event
+            else:
+                self._events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout: float) -> list[Event]:
+        """Возвращает накопившиеся события или пустой список, если за ``timeout`` их не было."""
+        with self._cond:
+            if not self._events and self._overflow is None:
+                self._cond.wait(timeout)
+            if self._overflow is not None:
+                last = self._overflow
+                self._overflow = None
+                return [Event(last.seq, self.auction_id, "resync", "{}")]
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+
+class AsyncSubscription(Subscription):
+    """
+    Подписка для asyncio-обработчика (asgi.py): события кладёт поток
+    приёмника, а ожидание в ``wait`` не занимает поток.
+    """
+
+    def __init__(self, auction_id: int, max_queue: int, loop: asyncio.AbstractEventLoop) -> None:
+        super().__init__(auction_id, max_queue)
+        self._loop = loop
+        self._ready = asyncio.Event()
+
+    def push(self, event: Event) -> None:
+        super().push(event)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Цикл событий уже закрыт: подписчика больше нет.
+            pass
+
+    async def wait(self, timeout: float) -> list[Event]:
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._ready.clear()
+        return self.get(0)
+
+
+def format_event(token: str, event: Event) -> str:
+    data = event.data.replace("\n", "\ndata: ")
+    return f"id: {token}-{event.seq}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+class EventHub:
+    """
+    Общий для процесса приёмник событий из канала ``auction_events``.
+
+    ``replay`` — сколько последних событий (всех аукционов) хранить для
+    переподключившихся клиентов, ``max_queue`` — сколько недоставленных
+    событий может накопить один подписчик.
+    """
+
+    def __init__(self, replay: int = 1000, max_queue: int = 256, max_subscribers: int = 10000) -> None:
+        self.token = uuid.uuid4().hex[:8]
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._recent: deque[Event] = deque(maxlen=replay)
+        self._subscribers: dict[int, set[Subscription]] = {}
+        self._count = 0
+        self._listeners: list[Callable[[dict], None]] = []
+        self._stopping = threading.Event()
+        # Подключалось ли уже слушающее соединение и слушает ли оно сейчас.
+        self._connected = False
+        self._listening = False
+        self._thread = threading.Thread(target=self._run, name="event-hub", daemon=True)
+        self._thread.start()
+
+    def add_listener(self, callback: Callable[[dict], None]) -> None:
+        """
+        Вызывает ``callback`` с разобранным событием любого аукциона (в потоке
+        приёмника). После переподключения LISTEN ``callback`` получает
+        ``{"type": "resync"}`` без ``auction_id``: события могли потеряться.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def _replay(self, auction_id: int, last_event_id: str | None) -> list[Event]:
+        # Вызывается под self._lock.
+        if not last_event_id:
+            return []
+        token, _, seq = last_event_id.partition("-")
+        if token != self.token or not seq.isdigit():
+            return [Event(self._seq, auction_id, "resync", "{}")]
+        last_seq = int(seq)
+        if last_seq >= self._seq:
+            return []
+        if not self._recent or self._recent[0].seq > last_seq + 1:
+            return [Event(self._seq, auction_id, "resync", "{}")]
+        return [e for e in self._recent if e.seq > last_seq and e.auction_id == auction_id]
+
+    def subscribe(
+        self,
+        auction_id: int,
+        last_event_id: str | None = None,
+        loop: asyncio.AbstractEventLoop | None = None,
+    ) -> Subscription:
+        """Подписывает на события аукциона; с ``loop`` возвращает ``AsyncSubscription``."""
+        if loop is not None:
+            subscription: Subscription = AsyncSubscription(auction_id, self.max_queue, loop)
+        else:
+            subscription = Subscription(auction_id, self.max_queue)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise TooManySubscribers(
+                    f"Подписчиков уже {self._count} из {self.max_subscribers}."
+                )
+            for event in self._replay(auction_id, last_event_id):
+                subscription.push(event)
+            self._subscribers.setdefault(auction_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.auction_id)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.auction_id]
+            self._count -= 1
+
+    def stream(self, subscription: Subscription, heartbeat: float = 15.0) -> "EventStream":
+        """
+        Тело ответа ``text/event-stream``. Комментарий-пинг раз в ``heartbeat``
+        секунд не даёт прокси закрыть соединение и позволяет заметить
+        отключившегося клиента; при закрытии ответа подписка снимается.
+        """
+        return EventStream(self, subscription, heartbeat)
+
+    def _stream(self, subscription: Subscription, heartbeat: float) -> Iterator[str]:
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while not self._stopping.is_set():
+                events = subscription.get(heartbeat)
+                if not events:
+                    yield ": ping\n\n"
+                    continue
+                yield "".join(format_event(self.token, event) for event in events)
+        finally:
+            self.unsubscribe(subscription)
+
+    async def astream(
+        self, subscription: AsyncSubscription, heartbeat: float = 15.0
+    ) -> AsyncIterator[str]:
+        """Асинхронный вариант ``stream`` для подписки, созданной с ``loop``."""
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while not self._stopping.is_set():
+                events = await subscription.wait(heartbeat)
+                if not events:
+                    yield ": ping\n\n"
+                    continue
+                yield "".join(format_event(self.token, event) for event in events)
+        finally:
+            self.unsubscribe(subscription)
+
+    def _publish(self, payload: str) -> None:
+        try:
+            parsed = json.loads(payload)
+            auction_id = int(parsed["auction_id"])
+            kind = str(parsed["type"])
+        except (ValueError, KeyError, TypeError):
+            log.warning("Некорректное событие в канале %s: %.200s", CHANNEL, payload)
+            return
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, auction_id, kind, payload)
+            self._recent.append(event)
+            subscribers = list(self._subscribers.get(auction_id, ()))
+            listeners = list(self._listeners)
+        for subscription in subscribers:
+            subscription.push(event)
+        for callback in listeners:
+            try:
+                callback(parsed)
+            except Exception:
+                log.exception("Ошибка обработчика события %s", kind)
+
+    def _resync_all(self) -> None:
+        # После обрыва LISTEN события могли потеряться: буфер для повторной
+        # отправки больше не полон, а текущим подписчикам нужно перечитать состояние.
+        with self._lock:
+            self._seq += 1
+            self._recent.clear()
+            subscriptions = [s for group in self._subscribers.values() for s in group]
+            seq = self._seq
+            listeners = list(self._listeners)
+        for subscription in subscriptions:
+            subscription.push(Event(seq, subscription.auction_id, "resync", "{}"))
+        for callback in listeners:
+            try:
+                callback({"type": "resync"})
+            except Exception:
+                log.exception("Ошибка обработчика события resync")
+
+    def _listen(self) -> None:
+        conn = connect()
+        try:
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {CHANNEL}")
+            if self._connected:
+                self._resync_all()
+            self._connected = self._listening = True
+            while not self._stopping.is_set():
+                if not select.select([conn], [], [], 5)[0]:
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._publish(conn.notifies.pop(0).payload)
+        finally:
+            self._listening = False
+            conn.close()
+
+    def _run(self) -> None:
+        delay = 1.0
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except (psycopg2.Error, OSError):
+                log.exception("Потеряно подключение для LISTEN %s, повтор через %g с", CHANNEL, delay)
+                self._stopping.wait(delay)
+                delay = min(delay * 2, 30.0)
+            else:
+                delay = 1.0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": self._count,
+                "auctions": len(self._subscribers),
+                "events": self._seq,
+                "buffered": len(self._recent),
+                "listening": self._listening,
+            }
+
+    def close(self) -> None:
+        self._stopping.set()
+
+
+class EventStream:
+    """
+    Итерируемое тело ответа из ``EventHub.stream``. WSGI-сервер вызывает
+    ``close`` и тогда, когда не начинал читать ответ (HEAD-запрос, клиент
+    отключился раньше): у незапущенного генератора ``finally`` не
+    выполняется, поэтому подписка снимается здесь.
+    """
+
+    def __init__(self, hub: EventHub, subscription: Subscription, heartbeat: float) -> None:
+        self._hub = hub
+        self._subscription = subscription
+        self._chunks = hub._stream(subscription, heartbeat)
+
+    def __iter__(self) -> Iterator[str]:
+        return self._chunks
+
+    def close(self) -> None:
+        self._chunks.close()
+        self._hub.unsubscribe(self._subscription)
+
+
+_hub: EventHub | None = None
+_hub_pid: int | None = None
+_hub_lock = threading.Lock()
+
+
+def get_event_hub() -> EventHub:
+    """
+    Возвращает приёмник событий процесса, создавая его при первом вызове.
+
+    Настройки берутся из переменных окружения:
+    - EVENTS_REPLAY (по умолчанию: 1000) — сколько последних событий хранить
+      для переподключившихся клиентов;
+    - EVENTS_QUEUE (по умолчанию: 256) — сколько событий может ждать
+      отправки одному клиенту;
+    - EVENTS_MAX_SUBSCRIBERS (по умолчанию: 10000) — предел подписчиков процесса.
+    """
+    global _hub, _hub_pid
+    if _hub is None or _hub_pid != os.getpid():
+        with _hub_lock:
+            if _hub is None or _hub_pid != os.getpid():
+                _hub = EventHub(
+                    replay=int(os.getenv("EVENTS_REPLAY", "1000")),
+                    max_queue=int(os.getenv("EVENTS_QUEUE", "256")),
+                    max_subscribers=int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000")),
+                )
+                _hub_pid = os.getpid()
+                atexit.register(_hub.close)
+    return _hub
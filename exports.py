@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+
+# Сколько символов сериализаторы накапливают перед отправкой: отправка
+# каждой строки отдельно стоит дороже самой сериализации.
+CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Денежные суммы отдаются строкой, чтобы не терять точность.
+        return str(value)
+    raise TypeError(f"Не удаётся сериализовать {type(value).__name__}")
+
+
+class _Serializer:
+    """
+    Общая часть синхронных и асинхронных сериализаторов: строки форматируются
+    в буфер, а ``add`` отдаёт накопленный текст, когда набралось
+    ``CHUNK_SIZE`` символов.
+    """
+
+    def __init__(self, export_format: str, columns: list[str]) -> None:
+        self._buffer = io.StringIO()
+        if export_format == "csv":
+            writer = csv.writer(self._buffer)
+            # BOM нужен, чтобы Excel распознал UTF-8. Заголовок пишется
+            # сразу, поэтому он есть и в выгрузке без строк.
+            self._buffer.write("\ufeff")
+            writer.writerow(columns)
+            self._write: Callable[[dict], Any] = lambda row: writer.writerow(row.values())
+        else:
+            self._write = lambda row: self._buffer.write(
+                json.dumps(row, ensure_ascii=False, default=_json_default) + "\n"
+            )
+
+    def add(self, row: dict) -> str | None:
+        self._write(row)
+        return self.rest() if self._buffer.tell() >= CHUNK_SIZE else None
+
+    def rest(self) -> str:
+        chunk = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return chunk
+
+
+def _serialize(export_format: str, columns: list[str], rows: Iterable[dict]) -> Iterator[str]:
+    serializer = _Serializer(export_format, columns)
+    for row in rows:
+        chunk = serializer.add(row)
+        if chunk:
+            yield chunk
+    tail = serializer.rest()
+    if tail:
+        yield tail
+
+
+async def _serialize_async(
+    export_format: str, columns: list[str], rows: AsyncIterable[dict]
+) -> AsyncIterator[str]:
+    serializer = _Serializer(export_format, columns)
+    async for row in rows:
+        chunk = serializer.add(row)
+        if chunk:
+            yield chunk
+    tail = serializer.rest()
+    if tail:
+        yield tail
+
+
+def to_csv(columns: list[str], rows: Iterable[dict]) -> Iterator[str]:
+    return _serialize("csv", columns, rows)
+
+
+def to_ndjson(columns: list[str], rows: Iterable[dict]) -> Iterator[str]:
+    return _serialize("ndjson", columns, rows)
+
+
+def to_csv_async(columns: list[str], rows: AsyncIterable[dict]) -> AsyncIterator[str]:
+    return _serialize_async("csv", columns, rows)
+
+
+def to_ndjson_async(columns: list[str], rows: AsyncIterable[dict]) -> AsyncIterator[str]:
+    return _serialize_async("ndjson", columns, rows)
+
+
+# Формат выгрузки -> (расширение файла, MIME-тип, сериализатор).
+# Сериализатор получает имена колонок и строки отчёта.
+FORMATS: dict[str, tuple[str, str, Callable[[list[str], Iterable[dict]], Iterator[str]]]] = {
+    "csv": ("csv", "text/csv; charset=utf-8", to_csv),
+    "ndjson": ("ndjson", "application/x-ndjson; charset=utf-8", to_ndjson),
+}
+
+# Асинхронные сериализаторы тех же форматов (см. asgi.py).
+ASYNC_SERIALIZERS: dict[str, Callable[[list[str], AsyncIterable[dict]], AsyncIterator[str]]] = {
+    "csv": to_csv_async,
+    "ndjson": to_ndjson_async,
+}
@@ -0,0 +1,71 @@
+"""
+Настройки gunicorn для промышленного запуска: ``gunicorn -c gunicorn.conf.py main:app``.
+
+Все параметры задаются переменными окружения (см. README, раздел «Запуск в продакшене»).
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+
+bind = os.getenv("WEB_BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_WORKERS", str(multiprocessing.cpu_count())))
+threads = int(os.getenv("WEB_THREADS", "4"))
+worker_class = "gthread"
+
+# Очередь ожидающих соединений ядра и число соединений, которые воркер
+# принимает одновременно (включая keep-alive). При перегрузке новые
+# соединения ждут в небольшой очереди или отклоняются, а не копятся
+# внутри процесса с растущими задержками.
+backlog = int(os.getenv("WEB_BACKLOG", "128"))
+worker_connections = int(os.getenv("WEB_WORKER_CONNECTIONS", str(threads * 4)))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+# Сколько секунд воркер дорабатывает текущие запросы после SIGHUP/SIGTERM.
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+# Плановый перезапуск воркеров ограничивает рост памяти; 0 — без перезапуска.
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+# Без preload код приложения загружает каждый воркер, поэтому SIGHUP
+# (плавный перезапуск воркеров) подхватывает новую версию кода.
+preload_app = os.getenv("WEB_PRELOAD") == "1"
+
+accesslog = os.getenv("WEB_ACCESS_LOG") or None
+errorlog = "-"
+
+# Каждому потоку воркера нужно своё подключение к БД, а всем воркерам
+# вместе — не больше DB_MAX_CONNECTIONS (max_connections сервера минус
+# запас для миграций и администрирования). Кроме пула воркер держит до
+# WORKER_EXTRA_CONNECTIONS собственных подключений: LISTEN событий торгов
+# (events.py) и запись ставок (bidding.py). Если DB_POOL_MAX не задан явно,
+# пул воркера получает min(threads, DB_MAX_CONNECTIONS // workers - 2); при
+# меньшем пуле лишние потоки ждут подключение DB_POOL_TIMEOUT секунд.
+WORKER_EXTRA_CONNECTIONS = 2
+db_budget = int(os.getenv("DB_MAX_CONNECTIONS", "90"))
+if "DB_POOL_MAX" not in os.environ:
+    os.environ["DB_POOL_MAX"] = str(
+        max(1, min(threads, db_budget // workers - WORKER_EXTRA_CONNECTIONS))
+    )
+if int(os.environ.get("DB_POOL_MIN", "1")) > int(os.environ["DB_POOL_MAX"]):
+    os.environ["DB_POOL_MIN"] = os.environ["DB_POOL_MAX"]
+
+
+def on_starting(server) -> None:
+    per_worker = int(os.environ["DB_POOL_MAX"]) + WORKER_EXTRA_CONNECTIONS
+    server.log.info(
+        "Воркеров: %s, потоков: %s, подключений к БД на воркер: %s (всего до %s из %s)",
+        workers,
+        threads,
+        per_worker,
+        workers * per_worker,
+        db_budget,
+    )
+    if workers * per_worker > db_budget:
+        server.log.warning(
+            "WEB_WORKERS × (DB_POOL_MAX + %s) = %s превышает DB_MAX_CONNECTIONS = %s",
+            WORKER_EXTRA_CONNECTIONS,
+            workers * per_worker,
+            db_budget,
+        )
@@ -0,0 +1,452 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import IO, Any, Iterator, NamedTuple, Optional
+
+# Сумма в формате NUMERIC(12, 2) без знака.
+_PRICE_RE = r"^\s*\d{1,10}([.,]\d{1,2})?\s*$"
+# Дата или дата и время в ISO-формате (допустимость дня проверяется отдельно).
+_TIMESTAMP_RE = (
+    r"^\s*[1-9]\d{3}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])"
+    r"([ T]([01]\d|2[0-3]):[0-5]\d(:[0-5]\d(\.\d{1,6})?)?)?\s*$"
+)
+
+
+class ImportSpec(NamedTuple):
+    table: str
+    # Колонки файла; в промежуточной таблице все они TEXT.
+    columns: tuple[str, ...]
+    # Дополнительные колонки промежуточной таблицы для разобранных значений.
+    resolved: str
+    # UPDATE-запросы, которые разбирают значения и отмечают ошибочные записи.
+    checks: tuple[str, ...]
+    insert: str
+
+
+class ImportResult(NamedTuple):
+    total: int
+    inserted: int
+    errors: int
+    # Первые ошибки: (номер записи, текст ошибки).
+    sample: list[tuple[int, str]]
+
+
+def _fail(message: str, condition: str) -> str:
+    return f"""
+        UPDATE import_rows SET error = {message}
+        WHERE error IS NULL AND ({condition})
+    """
+
+
+def _required(*columns: str) -> str:
+    missing = " OR ".join(f"{column} IS NULL" for column in columns)
+    return _fail(f"'не заполнены обязательные поля: {', '.join(columns)}'", missing)
+
+
+def _parse_price(column: str, target: str) -> tuple[str, ...]:
+    return (
+        _fail(f"'некорректная сумма {column}: ' || {column}", f"{column} !~ '{_PRICE_RE}'"),
+        f"""
+        UPDATE import_rows SET {target} = replace(btrim({column}), ',', '.')::numeric
+        WHERE error IS NULL
+        """,
+    )
+
+
+def _resolve(
+    target: str,
+    id_column: str,
+    name_column: str | None,
+    table: str,
+    label: str,
+    scope: str = "TRUE",
+) -> tuple[str, ...]:
+    """
+    Заполняет ``target`` идентификатором записи из ``table``: по колонке
+    ``id_column`` или, если она пуста, по точному совпадению ``name_column``
+    с названием. Неоднозначные названия считаются ошибкой.
+    """
+    statements = [
+        f"""
+        UPDATE import_rows r SET {target} = t.id
+        FROM {table} t
+        WHERE r.error IS NULL AND ({scope})
+          AND t.id = CASE WHEN r.{id_column} ~ '^\\s*\\d{{1,9}}\\s*$'
+                          THEN btrim(r.{id_column})::integer END
+        """
+    ]
+    given = f"{id_column} IS NOT NULL"
+    if name_column is not None:
+        statements.append(
+            f"""
+            UPDATE import_rows r SET {target} = t.id
+            FROM (
+                SELECT name, MIN(id) AS id
+                FROM {table}
+                WHERE name IN (SELECT {name_column} FROM import_rows)
+                GROUP BY name
+                HAVING COUNT(*) = 1
+            ) t
+            WHERE r.error IS NULL AND ({scope})
+              AND r.{id_column} IS NULL
+              AND t.name = r.{name_column}
+            """
+        )
+        given = f"COALESCE({id_column}, {name_column}) IS NOT NULL"
+    statements.append(
+        _fail(
+            f"""
+            CASE WHEN {given}
+                 THEN '{label} не найден или название неоднозначно: '
+                      || COALESCE({id_column}, {name_column or 'NULL'})
+                 ELSE 'не указан {label}'
+            END
+            """,
+            f"({scope}) AND {target} IS NULL",
+        )
+    )
+    return tuple(statements)
+
+
+def _duplicates(key: str, message: str) -> str:
+    return f"""
+        UPDATE import_rows r
+        SET error = '{message} (запись ' || d.first_no || ')'
+        FROM (
+            SELECT record_no, MIN(record_no) OVER (PARTITION BY {key}) AS first_no
+            FROM import_rows
+            WHERE error IS NULL
+        ) d
+        WHERE r.record_no = d.record_no AND d.record_no <> d.first_no
+    """
+
+
+SPECS: dict[str, ImportSpec] = {
+    "participants": ImportSpec(
+        table="participants",
+        columns=("name", "contact_info", "notes"),
+        resolved="",
+        checks=(_required("name"),),
+        insert="""
+            INSERT INTO participants (name, contact_info, notes)
+            SELECT name, contact_info, notes
+            FROM import_rows
+            WHERE error IS NULL
+            ORDER BY record_no
+        """,
+    ),
+    "items": ImportSpec(
+        table="items",
+        columns=(
+            "auction_id",
+            "auction",
+            "seller_id",
+            "seller",
+            "lot_number",
+            "title",
+            "start_price",
+            "description",
+        ),
+        resolved="auction_ref INTEGER, seller_ref INTEGER, price NUMERIC(12, 2)",
+        checks=(
+            _required("lot_number", "title", "start_price"),
+            *_parse_price("start_price", "price"),
+            *_resolve("auction_ref", "auction_id", "auction", "auctions", "аукцион"),
+            *_resolve("seller_ref", "seller_id", "seller", "participants", "продавец"),
+            _duplicates("auction_ref, lot_number", "лот повторяется в файле"),
+            _fail(
+                "'лот ' || lot_number || ' уже есть в аукционе'",
+                """
+                EXISTS (
+                    SELECT 1 FROM items i
+                    WHERE i.auction_id = import_rows.auction_ref
+                      AND i.lot_number = import_rows.lot_number
+                )
+                """,
+            ),
+        ),
+        insert="""
+            INSERT INTO items (auction_id, seller_id, lot_number, title, start_price, description)
+            SELECT auction_ref, seller_ref, lot_number, title, price, description
+            FROM import_rows
+            WHERE error IS NULL
+            ORDER BY record_no
+            ON CONFLICT (auction_id, lot_number) DO NOTHING
+        """,
+    ),
+    "sales": ImportSpec(
+        table="sales",
+        columns=(
+            "item_id",
+            "auction_id",
+            "auction",
+            "lot_number",
+            "buyer_id",
+            "buyer",
+            "sold_price",
+            "sold_at",
+        ),
+        resolved=(
+            "auction_ref INTEGER, item_ref INTEGER, buyer_ref INTEGER, "
+            "price NUMERIC(12, 2), sold_ts TIMESTAMP"
+        ),
+        checks=(
+            _required("sold_price", "sold_at"),
+            *_parse_price("sold_price", "price"),
+            _fail("'некорректная дата sold_at: ' || sold_at", f"sold_at !~ '{_TIMESTAMP_RE}'"),
+            # Регулярное выражение пропускает, например, 31 февраля. CASE
+            # гарантирует, что приведения типов не выполняются для строк,
+            # уже отмеченных как ошибочные.
+            _fail(
+                "'некорректная дата sold_at: ' || sold_at",
+                """
+                CASE WHEN error IS NULL THEN
+                    substr(btrim(sold_at), 9, 2)::int > extract(day FROM
+                        make_date(substr(btrim(sold_at), 1, 4)::int,
+                                  substr(btrim(sold_at), 6, 2)::int, 1)
+                        + interval '1 month - 1 day')
+                END
+                """,
+            ),
+            "UPDATE import_rows SET sold_ts = btrim(sold_at)::timestamp WHERE error IS NULL",
+            # Предмет задаётся item_id или парой «аукцион + номер лота».
+            *_resolve(
+                "auction_ref", "auction_id", "auction", "auctions", "аукцион", scope="item_id IS NULL"
+            ),
+            """
+            UPDATE import_rows r SET item_ref = i.id
+            FROM items i
+            WHERE r.error IS NULL AND r.item_id IS NULL
+              AND i.auction_id = r.auction_ref AND i.lot_number = r.lot_number
+            """,
+            _fail(
+                "'лот ' || COALESCE(lot_number, '') || ' не найден в аукционе'",
+                "item_id IS NULL AND item_ref IS NULL",
+            ),
+            *_resolve("item_ref", "item_id", None, "items", "предмет", scope="item_id IS NOT NULL"),
+            *_resolve("buyer_ref", "buyer_id", "buyer", "participants", "покупатель"),
+            _duplicates("item_ref", "предмет повторяется в файле"),
+            _fail(
+                "'предмет уже продан'",
+                "EXISTS (SELECT 1 FROM sales s WHERE s.item_id = import_rows.item_ref)",
+            ),
+        ),
+        insert="""
+            INSERT INTO sales (item_id, buyer_id, sold_price, sold_at)
+            SELECT item_ref, buyer_ref, price, sold_ts
+            FROM import_rows
+            WHERE error IS NULL
+            ORDER BY record_no
+            ON CONFLICT (item_id) DO NOTHING
+        """,
+    ),
+}
+
+FORMATS = ("csv", "ndjson")
+
+
+class TextStream(io.TextIOBase):
+    """Файлоподобная обёртка над генератором строк для ``copy_expert``."""
+
+    def __init__(self, chunks: Iterator[str]) -> None:
+        self._chunks = chunks
+        self._buffer = ""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+# Запись промежуточной таблицы: (номер записи, текст ошибки, значения колонок).
+StagingRow = tuple[int, Optional[str], list[Optional[str]]]
+
+
+def _ndjson_rows(source: IO[str], columns: tuple[str, ...]) -> Iterator[StagingRow]:
+    """
+    Разбирает JSON Lines. Номер записи — номер строки файла; строки, которые
+    не удалось разобрать, попадают в промежуточную таблицу сразу с текстом
+    ошибки.
+    """
+    known = set(columns)
+    for line_no, line in enumerate(source, start=1):
+        if not line.strip():
+            continue
+        values: list[Any] = [None] * len(columns)
+        error = None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+            error = "некорректный JSON"
+        if error is None and not isinstance(record, dict):
+            error = "запись должна быть JSON-объектом"
+        elif error is None:
+            unknown = sorted(set(record) - known)
+            if unknown:
+                error = "неизвестные поля: " + ", ".join(unknown)
+            else:
+                for index, column in enumerate(columns):
+                    value = record.get(column)
+                    if isinstance(value, (dict, list)):
+                        error = f"поле {column} должно быть строкой или числом"
+                        break
+                    values[index] = None if value is None else str(value)
+        if error is not None:
+            values = [None] * len(columns)
+        yield line_no, error, values
+
+
+def _csv_header(source: IO[str], columns: tuple[str, ...]) -> list[str]:
+    header = next(csv.reader([source.readline()]), [])
+    header = [name.strip().lower() for name in header]
+    unknown = sorted(set(header) - set(columns))
+    if unknown or not header or len(set(header)) != len(header):
+        raise ValueError(
+            "Некорректный заголовок файла. Допустимые колонки: " + ", ".join(columns)
+        )
+    return header
+
+
+def _csv_rows(
+    source: IO[str], header: list[str], columns: tuple[str, ...]
+) -> Iterator[StagingRow]:
+    """
+    Разбирает CSV после заголовка. Номер записи — номер строки данных без
+    заголовка; записи с другим числом полей или с ошибкой разбора (например,
+    незакрытой кавычкой) попадают в промежуточную таблицу с текстом ошибки.
+    Пустые значения (в том числе "") загружаются как NULL.
+    """
+    positions = [header.index(column) if column in header else None for column in columns]
+    reader = csv.reader(source, strict=True)
+    record_no = 0
+    while True:
+        try:
+            fields = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            record_no += 1
+            error = f"некорректная запись CSV (строка файла {reader.line_num}): {exc}"
+            yield record_no, error, [None] * len(columns)
+            continue
+        if not fields:
+            continue
+        record_no += 1
+        if len(fields) != len(header):
+            error = f"ожидалось полей: {len(header)}, в записи: {len(fields)}"
+            yield record_no, error, [None] * len(columns)
+            continue
+        if any("\x00" in value for value in fields):
+            yield record_no, "недопустимый символ NUL", [None] * len(columns)
+            continue
+        values = [None if index is None else fields[index] or None for index in positions]
+        yield record_no, None, values
+
+
+def _staging_csv(rows: Iterator[StagingRow]) -> Iterator[str]:
+    """Сериализует записи промежуточной таблицы в CSV для COPY пачками."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record_no, error, values in rows:
+        writer.writerow([record_no, error, *values])
+        if buffer.tell() >= 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _copy(cur: Any, spec: ImportSpec, source: IO[str], file_format: str) -> None:
+    # Файл разбирается в Python, поэтому ошибка в одной записи не прерывает COPY.
+    if file_format == "csv":
+        rows = _csv_rows(source, _csv_header(source, spec.columns), spec.columns)
+    else:
+        rows = _ndjson_rows(source, spec.columns)
+    columns = ", ".join(spec.columns)
+    cur.copy_expert(
+        f"COPY import_rows (record_no, error, {columns}) FROM STDIN WITH (FORMAT csv)",
+        TextStream(_staging_csv(rows)),
+    )
+
+
+def import_file(
+    conn: Any,
+    kind: str,
+    source: IO[str],
+    file_format: str = "csv",
+    dry_run: bool = False,
+    strict: bool = False,
+    errors_out: IO[str] | None = None,
+    sample_size: int = 20,
+) -> ImportResult:
+    """
+    Загружает записи ``kind`` (см. ``SPECS``) из CSV с заголовком или JSON Lines.
+
+    Файл передаётся потоком через ``COPY FROM STDIN`` во временную таблицу,
+    после чего значения проверяются, а ссылки на аукционы, участников и
+    предметы разрешаются несколькими set-based запросами. Корректные записи
+    вставляются одним ``INSERT ... SELECT`` в той же транзакции; ошибочные
+    пропускаются и возвращаются в отчёте (все — в ``errors_out`` как CSV).
+
+    При ``strict`` и наличии ошибок, а также при ``dry_run`` транзакция
+    откатывается. Некорректный заголовок CSV — ``ValueError``.
+    """
+    spec = SPECS[kind]
+    if file_format not in FORMATS:
+        raise ValueError(f"Неизвестный формат файла: {file_format}")
+    cur = conn.cursor()
+    try:
+        columns = ", ".join(f"{column} TEXT" for column in spec.columns)
+        resolved = f", {spec.resolved}" if spec.resolved else ""
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE import_rows (
+                record_no BIGINT GENERATED BY DEFAULT AS IDENTITY,
+                error TEXT,
+                {columns}{resolved}
+            ) ON COMMIT DROP
+            """
+        )
+        _copy(cur, spec, source, file_format)
+        cur.execute("ANALYZE import_rows")
+        for statement in spec.checks:
+            cur.execute(statement)
+
+        cur.execute("SELECT COUNT(*) AS total, COUNT(error) AS errors FROM import_rows")
+        counts = cur.fetchone()
+        cur.execute(
+            "SELECT record_no, error FROM import_rows WHERE error IS NOT NULL "
+            "ORDER BY record_no LIMIT %s",
+            (sample_size,),
+        )
+        sample = [(row["record_no"], row["error"]) for row in cur.fetchall()]
+        if errors_out is not None:
+            cur.copy_expert(
+                "COPY (SELECT record_no, error FROM import_rows WHERE error IS NOT NULL "
+                "ORDER BY record_no) TO STDOUT WITH (FORMAT csv, HEADER)",
+                errors_out,
+            )
+
+        inserted = 0
+        if not dry_run and not (strict and counts["errors"]):
+            cur.execute(spec.insert)
+            inserted = cur.rowcount
+            conn.commit()
+        else:
+            conn.rollback()
+    except Exception:
+        conn.rollback()
+        raise
+    return ImportResult(counts["total"], inserted, counts["errors"], sample)
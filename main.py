@@ -1,27 +1,70 @@
 from __future__ import annotations
 
-from datetime import date, timedelta
+import os
+from collections.abc import Mapping
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
 from typing import Iterable
 
+import psycopg2
+import psycopg2.errors
 from flask import (
     Flask,
+    Response,
     flash,
     g,
+    jsonify,
     redirect,
     render_template,
     request,
+    stream_template,
+    stream_with_context,
     url_for,
 )
+from markupsafe import Markup, escape
 
-from db import AuctionDB
+import exports
+import queries
+from bidding import MAX_AMOUNT, BidRejected, LotBusy, LotNotFound, close_lot, get_bid_book
+from cache import ReferenceCache
+from events import TooManySubscribers, get_event_hub
+from db import AuctionDB, get_pool
+from pagination import Keyset, Page, paginate
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "dev-secret"
+# Загружать все данные главной страницы одним запросом вместо трёх.
+app.config["DASHBOARD_BATCH"] = os.getenv("DASHBOARD_BATCH") == "1"
+app.config["PAGE_SIZE"] = int(os.getenv("PAGE_SIZE", "50"))
+app.config["MAX_PAGE_SIZE"] = int(os.getenv("MAX_PAGE_SIZE", "500"))
+# Сколько строк отчёта подгружать из серверного курсора за раз.
+app.config["STREAM_BATCH_SIZE"] = int(os.getenv("STREAM_BATCH_SIZE", "2000"))
+# Сколько секунд справочные данные форм живут в кэше процесса.
+app.config["REFERENCE_CACHE_TTL"] = float(os.getenv("REFERENCE_CACHE_TTL", "30"))
+app.config["SEARCH_LIMIT"] = int(os.getenv("SEARCH_LIMIT", "20"))
+# Как часто отправлять пинг в поток событий, если событий нет, с.
+app.config["EVENTS_HEARTBEAT"] = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+# Поток событий в WSGI занимает поток воркера на всё время подключения,
+# поэтому по умолчанию его обслуживает только asgi.py.
+app.config["EVENTS_WSGI"] = os.getenv("EVENTS_WSGI") == "1"
+
+SEARCH_MIN_QUERY = 2
+SEARCH_MAX_LIMIT = 100
+
+reference_cache = ReferenceCache(app.config["REFERENCE_CACHE_TTL"])
+
+AUCTIONS_KEYSET = Keyset(
+    "starts_at", "id", "starts_at", "id", descending=True, key_type="timestamp"
+)
+PARTICIPANTS_KEYSET = Keyset("LOWER(name)", "id", "sort_name", "id")
+SOLD_ITEMS_KEYSET = Keyset(
+    "s.sold_at", "s.id", "sold_at", "id", descending=True, key_type="timestamp"
+)
 
 
 def get_db() -> AuctionDB:
     if "db" not in g:
-        g.db = AuctionDB()
+        g.db = AuctionDB(pool=get_pool())
     return g.db
 
 
@@ -32,50 +75,130 @@ def close_db(_: BaseException | None) -> None:
         db.close()
 
 
+@app.route("/health/pool")
+def pool_stats():
+    return jsonify(get_pool().stats())
+
+
+@app.route("/health/bids")
+def bid_stats():
+    return jsonify(get_bid_book().stats())
+
+
+@app.route("/health/events")
+def event_stats():
+    return jsonify(get_event_hub().stats())
+
+
 def default_period(days: int = 30) -> tuple[str, str]:
     period_end = date.today()
     period_start = period_end - timedelta(days=days)
     return period_start.isoformat(), period_end.isoformat()
 
 
-def period_from_request(days: int = 30) -> tuple[str, str]:
+def period_with_warning(days: int = 30) -> tuple[str, str, str | None]:
+    """
+    Период из параметров запроса и текст предупреждения, если период
+    некорректен и заменён периодом по умолчанию. Потоковые страницы
+    (stream_template) показывают предупреждение сами: сессия с flash()
+    отправляется до того, как шаблон прочитает сообщения.
+    """
     start_default, end_default = default_period(days)
     start = request.args.get("start") or start_default
     end = request.args.get("end") or end_default
+    try:
+        queries.period_bounds(start, end)
+    except ValueError:
+        return start_default, end_default, "Некорректный период, показаны данные за последние дни."
+    return start, end, None
+
+
+def period_from_request(days: int = 30) -> tuple[str, str]:
+    start, end, warning = period_with_warning(days)
+    if warning is not None:
+        flash(warning, "warning")
     return start, end
 
 
+def _dashboard_batch(db: AuctionDB) -> tuple[list[dict], dict, list[dict]]:
+    totals = dict(db.get(queries.DASHBOARD_BATCH_SQL))
+    upcoming = totals.pop("upcoming")
+    top_sellers = totals.pop("top_sellers")
+    for auction in upcoming:
+        auction["starts_at"] = datetime.fromisoformat(auction["starts_at"])
+    for seller in top_sellers:
+        if seller["total"] is not None:
+            seller["total"] = Decimal(seller["total"])
+    return upcoming, totals, top_sellers
+
+
+def page_size_from_request() -> int:
+    default = app.config["PAGE_SIZE"]
+    try:
+        size = int(request.args.get("per_page", default))
+    except ValueError:
+        size = default
+    return max(1, min(size, app.config["MAX_PAGE_SIZE"]))
+
+
+def page_from_request(
+    db: AuctionDB, sql: str, keyset: Keyset, where: list[str], params: list
+) -> Page:
+    page_size = page_size_from_request()
+    try:
+        return paginate(
+            db,
+            sql,
+            keyset,
+            where,
+            params,
+            page_size,
+            after=request.args.get("after"),
+            before=request.args.get("before"),
+        )
+    except ValueError:
+        flash("Некорректная ссылка на страницу, показана первая страница.", "warning")
+        return paginate(db, sql, keyset, where, params, page_size)
+
+
+def export_response(
+    db: AuctionDB, name: str, sql: str, params: Iterable = ()
+) -> Response | None:
+    """
+    Если в запросе указан ``?format=csv`` или ``?format=ndjson``, возвращает
+    потоковую выгрузку отчёта; иначе ``None``.
+    """
+    export_format = request.args.get("format")
+    if export_format not in exports.FORMATS:
+        return None
+    extension, mimetype, serialize = exports.FORMATS[export_format]
+    rows = db.stream(
+        sql, params, batch_size=app.config["STREAM_BATCH_SIZE"], with_columns=True
+    )
+    body = serialize(next(rows), rows)
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'},
+    )
+
+
+@app.template_global()
+def page_url(**cursor: str) -> str:
+    args = {k: v for k, v in request.args.items() if k not in ("after", "before")}
+    args.update(cursor)
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
 @app.route("/")
 def index():
     db = get_db()
-    upcoming = db.query(
-        """
-        SELECT id, name, location, starts_at, description
-        FROM auctions
-        ORDER BY starts_at
-        LIMIT 5
-        """
-    )
-    totals = {
-        "auctions": db.get("SELECT COUNT(*) AS c FROM auctions")["c"],
-        "participants": db.get("SELECT COUNT(*) AS c FROM participants")["c"],
-        "items_count": db.get("SELECT COUNT(*) AS c FROM items")["c"],
-        "sales": db.get("SELECT COUNT(*) AS c FROM sales")["c"],
-        "revenue": db.get("SELECT COALESCE(SUM(sold_price), 0) AS total FROM sales")[
-            "total"
-        ],
-    }
-    top_sellers = db.query(
-        """
-        SELECT p.name, SUM(s.sold_price) AS total
-        FROM participants p
-        JOIN items i ON i.seller_id = p.id
-        JOIN sales s ON s.item_id = i.id
-        GROUP BY p.id
-        ORDER BY total DESC
-        LIMIT 5
-        """
-    )
+    if app.config["DASHBOARD_BATCH"]:
+        upcoming, totals, top_sellers = _dashboard_batch(db)
+    else:
+        upcoming = db.query(queries.UPCOMING_AUCTIONS_SQL)
+        totals = db.get(queries.DASHBOARD_TOTALS_SQL)
+        top_sellers = db.query(queries.TOP_SELLERS_SQL)
     return render_template(
         "index.html",
         upcoming=upcoming,
@@ -90,34 +213,18 @@ def auctions():
     start, end = period_from_request()
     location = request.args.get("location", "")
 
-    clauses: list[str] = []
-    params: list[str] = []
-    if start:
-        clauses.append("date(starts_at) >= %s")
-        params.append(start)
-    if end:
-        clauses.append("date(starts_at) <= %s")
-        params.append(end)
+    period_sql, params = queries.period_filter("starts_at", start, end)
+    clauses: list[str] = [period_sql]
     if location:
         clauses.append("location = %s")
         params.append(location)
 
-    where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-    auctions = db.query(
-        f"""
-        SELECT id, name, location, starts_at, description
-        FROM auctions
-        {where_sql}
-        ORDER BY starts_at DESC
-        """,
-        params,
-    )
-    locations = db.query(
-        "SELECT location FROM auctions GROUP BY location ORDER BY LOWER(location)"
-    )
+    page = page_from_request(db, queries.AUCTIONS_PAGE_SQL, AUCTIONS_KEYSET, clauses, params)
+    locations = db.query(queries.AUCTION_LOCATIONS_SQL)
     return render_template(
         "auctions.html",
-        auctions=auctions,
+        auctions=page.rows,
+        page=page,
         start=start,
         end=end,
         location=location,
@@ -125,6 +232,30 @@ def auctions():
     )
 
 
+@app.route("/auctions/<int:auction_id>/events")
+def auction_events(auction_id: int):
+    """
+    Поток Server-Sent Events аукциона: ставки, продажи, открытие и закрытие
+    лотов (см. events.py). Под gunicorn включается только с EVENTS_WSGI=1.
+    """
+    if not app.config["EVENTS_WSGI"]:
+        return jsonify(error="Поток событий обслуживает ASGI-приложение (asgi.py)."), 404
+    if get_db().get("SELECT 1 AS found FROM auctions WHERE id = %s", (auction_id,)) is None:
+        return jsonify(error="Аукцион не найден."), 404
+    # Поток может длиться часами: подключение к БД сразу возвращается в пул.
+    close_db(None)
+    hub = get_event_hub()
+    try:
+        subscription = hub.subscribe(auction_id, request.headers.get("Last-Event-ID"))
+    except TooManySubscribers as exc:
+        return jsonify(error=str(exc)), 503, {"Retry-After": "30"}
+    return Response(
+        hub.stream(subscription, app.config["EVENTS_HEARTBEAT"]),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/auctions/add", methods=["GET", "POST"])
 def add_auction():
     db = get_db()
@@ -144,26 +275,25 @@ def add_auction():
             """,
             (name, location, starts_at, description),
         )
+        reference_cache.invalidate("auctions")
         flash("Аукцион добавлен.", "success")
         return redirect(url_for("auctions"))
 
     return render_template("add_auction.html")
 
 
-@app.route("/items/add", methods=["GET", "POST"])
-def add_item():
-    db = get_db()
-    auctions = db.query(
-        "SELECT id, name, starts_at FROM auctions ORDER BY starts_at DESC"
+def _form_availability() -> dict:
+    return reference_cache.get(
+        "form_availability",
+        ("auctions", "participants", "items", "sales"),
+        lambda: get_db().get(queries.FORM_AVAILABILITY_SQL),
     )
-    participants = db.query("SELECT id, name FROM participants ORDER BY LOWER(name)")
-    if not auctions or not participants:
-        flash("Добавьте хотя бы один аукцион и участника.", "warning")
-        return render_template(
-            "add_item.html", auctions=auctions, participants=participants
-        )
 
+
+@app.route("/items/add", methods=["GET", "POST"])
+def add_item():
     if request.method == "POST":
+        # Списки для формы на POST не нужны: ссылки проверяет сама БД.
         auction_id = request.form.get("auction_id")
         seller_id = request.form.get("seller_id")
         lot_number = request.form.get("lot_number", "").strip()
@@ -178,50 +308,33 @@ def add_item():
         except ValueError:
             flash("Стартовая цена должна быть числом.", "danger")
             return redirect(url_for("add_item"))
-        db.execute(
-            """
-            INSERT INTO items (auction_id, seller_id, lot_number, title, start_price, description)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
-            """,
-            (auction_id, seller_id, lot_number, title, price_value, description),
-        )
+        try:
+            get_db().execute(
+                """
+                INSERT INTO items (auction_id, seller_id, lot_number, title, start_price, description)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING id
+                """,
+                (auction_id, seller_id, lot_number, title, price_value, description),
+            )
+        except psycopg2.errors.UniqueViolation:
+            flash("Лот с таким номером уже есть в этом аукционе.", "danger")
+            return redirect(url_for("add_item"))
+        except (psycopg2.DataError, psycopg2.IntegrityError):
+            flash("Аукцион или продавец не найдены, либо данные некорректны.", "danger")
+            return redirect(url_for("add_item"))
+        reference_cache.invalidate("items")
         flash("Предмет добавлен на аукцион.", "success")
         return redirect(url_for("auctions"))
 
-    return render_template(
-        "add_item.html",
-        auctions=auctions,
-        participants=participants,
-    )
-
-
-def _unsold_items(db: AuctionDB) -> Iterable[dict]:
-    return db.query(
-        """
-        SELECT i.id,
-               i.title,
-               i.lot_number,
-               a.name AS auction_name,
-               a.starts_at
-        FROM items i
-        JOIN auctions a ON a.id = i.auction_id
-        LEFT JOIN sales s ON s.item_id = i.id
-        WHERE s.id IS NULL
-        ORDER BY a.starts_at DESC
-        """
-    )
+    available = _form_availability()
+    if not available["has_auctions"] or not available["has_participants"]:
+        flash("Добавьте хотя бы один аукцион и участника.", "warning")
+    return render_template("add_item.html")
 
 
 @app.route("/sales/add", methods=["GET", "POST"])
 def add_sale():
-    db = get_db()
-    items = _unsold_items(db)
-    buyers = db.query("SELECT id, name FROM participants ORDER BY LOWER(name)")
-    if not items:
-        flash("Нет доступных предметов для продажи.", "warning")
-    if not buyers:
-        flash("Добавьте хотя бы одного покупателя.", "warning")
     if request.method == "POST":
         item_id = request.form.get("item_id")
         buyer_id = request.form.get("buyer_id")
@@ -231,117 +344,348 @@ def add_sale():
             flash("Заполните все поля продажи.", "danger")
             return redirect(url_for("add_sale"))
         try:
-            price_value = float(sold_price)
-        except ValueError:
+            price_value = Decimal(sold_price)
+        except InvalidOperation:
             flash("Цена продажи должна быть числом.", "danger")
             return redirect(url_for("add_sale"))
-        exists = db.get("SELECT id FROM sales WHERE item_id = %s", (item_id,))
-        if exists:
+        # Decimal принимает и NaN/Infinity: такие цены отсекаются как у ставок.
+        if not price_value.is_finite():
+            flash("Цена продажи должна быть числом.", "danger")
+            return redirect(url_for("add_sale"))
+        if price_value < 0:
+            flash("Цена продажи не может быть отрицательной.", "danger")
+            return redirect(url_for("add_sale"))
+        # Одна команда: уникальность item_id проверяет сама БД, а статус
+        # предмета, счётчики и сводки обновляют триггеры в той же транзакции.
+        try:
+            sale_id = get_db().execute(
+                """
+                INSERT INTO sales (item_id, buyer_id, sold_price, sold_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (item_id) DO NOTHING
+                RETURNING id
+                """,
+                (item_id, buyer_id, price_value, sold_at),
+            )
+        except psycopg2.DataError:
+            flash("Некорректные данные продажи.", "danger")
+            return redirect(url_for("add_sale"))
+        except psycopg2.IntegrityError:
+            flash("Предмет или покупатель не найдены.", "danger")
+            return redirect(url_for("add_sale"))
+        if not sale_id:
             flash("Предмет уже продан.", "danger")
             return redirect(url_for("add_sale"))
-        db.execute(
-            """
-            INSERT INTO sales (item_id, buyer_id, sold_price, sold_at)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id
-            """,
-            (item_id, buyer_id, price_value, sold_at),
-        )
+        reference_cache.invalidate("sales")
+        # Событие sale закроет торги и в других процессах, но в этом процессе
+        # ставки по лоту прекращаются сразу, не дожидаясь NOTIFY.
+        close_lot(int(item_id))
         flash("Продажа сохранена.", "success")
         return redirect(url_for("sold_items"))
 
-    return render_template("add_sale.html", items=items, buyers=buyers)
+    available = _form_availability()
+    if not available["has_unsold_items"]:
+        flash("Нет доступных предметов для продажи.", "warning")
+    if not available["has_participants"]:
+        flash("Добавьте хотя бы одного покупателя.", "warning")
+    return render_template("add_sale.html")
+
+
+def _auction_label(auction: dict) -> str:
+    return f"{auction['name']} — {auction['starts_at']:%Y-%m-%d %H:%M}"
+
+
+def _search_params() -> dict | None:
+    query = request.args.get("q", "").strip().lower()
+    if len(query) < SEARCH_MIN_QUERY:
+        return None
+    try:
+        limit = int(request.args.get("limit", app.config["SEARCH_LIMIT"]))
+    except ValueError:
+        limit = app.config["SEARCH_LIMIT"]
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    prefix = f"{escaped}%"
+    # Из строки короче трёх символов не извлечь триграммы: ищем по префиксу.
+    pattern = prefix if len(query) < 3 else f"%{escaped}%"
+    return {
+        "pattern": pattern,
+        "prefix": prefix,
+        "q": query,
+        "limit": max(1, min(limit, SEARCH_MAX_LIMIT)),
+    }
+
+
+@app.route("/api/participants/search")
+def search_participants():
+    params = _search_params()
+    if params is None:
+        return jsonify(results=[])
+    rows = get_db().query(queries.SEARCH_PARTICIPANTS_SQL, params)
+    return jsonify(results=[{"id": row["id"], "label": row["name"]} for row in rows])
+
+
+@app.route("/api/auctions/search")
+def search_auctions():
+    params = _search_params()
+    if params is None:
+        return jsonify(results=[])
+    rows = get_db().query(queries.SEARCH_AUCTIONS_SQL, params)
+    return jsonify(results=[{"id": row["id"], "label": _auction_label(row)} for row in rows])
+
+
+@app.route("/api/items/unsold/search")
+def search_unsold_items():
+    params = _search_params()
+    if params is None:
+        return jsonify(results=[])
+    rows = get_db().query(queries.SEARCH_UNSOLD_ITEMS_SQL, params)
+    return jsonify(
+        results=[
+            {
+                "id": row["id"],
+                "label": (
+                    f"{row['title']} (лот {row['lot_number']}) — "
+                    f"{row['auction_name']} / {row['starts_at']:%Y-%m-%d %H:%M}"
+                ),
+            }
+            for row in rows
+        ]
+    )
+
+
+def _highlight(text: str) -> Markup:
+    return (
+        escape(text)
+        .replace(queries.SEARCH_HIGHLIGHT_START, Markup("<mark>"))
+        .replace(queries.SEARCH_HIGHLIGHT_STOP, Markup("</mark>"))
+    )
+
+
+def _item_search_filters() -> tuple[list[str], list]:
+    """
+    Собирает условия поиска по лотам из параметров запроса: период проведения
+    аукциона (``start``/``end``, любая из границ необязательна) и ``auction_id``.
+    При некорректных значениях выбрасывает ``ValueError``.
+    """
+    start = request.args.get("start", "")
+    end = request.args.get("end", "")
+    auction_id = request.args.get("auction_id", "")
+    clauses: list[str] = []
+    params: list = []
+    if start and end:
+        period_sql, params = queries.period_filter("a.starts_at", start, end)
+        clauses.append(period_sql)
+    elif start:
+        clauses.append("a.starts_at >= %s")
+        params.append(date.fromisoformat(start))
+    elif end:
+        clauses.append("a.starts_at < %s")
+        params.append(date.fromisoformat(end) + timedelta(days=1))
+    if auction_id:
+        clauses.append("a.id = %s")
+        params.append(int(auction_id))
+    return clauses, params
+
+
+def search_items(db: AuctionDB, query: str) -> list[dict]:
+    """Ищет лоты по названию и описанию; строки дополняются подсвеченными фрагментами."""
+    if not query:
+        return []
+    clauses, params = _item_search_filters()
+    sql = queries.ITEM_SEARCH_SQL.format(where=" AND ".join(clauses) or "TRUE")
+    rows = db.query(sql, [query, *params, page_size_from_request()])
+    for row in rows:
+        row["title_html"] = _highlight(row.pop("title_highlight"))
+        row["description_html"] = _highlight(row.pop("description_highlight"))
+    return rows
+
+
+@app.route("/search")
+def search():
+    db = get_db()
+    query = request.args.get("q", "").strip()
+    try:
+        results = search_items(db, query)
+    except ValueError:
+        flash("Некорректные фильтры поиска.", "warning")
+        results = []
+    auction = None
+    if request.args.get("auction_id", "").isdigit():
+        auction = db.get(
+            "SELECT id, name, starts_at FROM auctions WHERE id = %s",
+            (int(request.args["auction_id"]),),
+        )
+    return render_template(
+        "search.html",
+        query=query,
+        results=results,
+        start=request.args.get("start", ""),
+        end=request.args.get("end", ""),
+        auction=auction,
+        auction_label=_auction_label(auction) if auction else "",
+    )
+
+
+@app.route("/api/items/search")
+def search_items_api():
+    try:
+        rows = search_items(get_db(), request.args.get("q", "").strip())
+    except ValueError:
+        return jsonify(error="Некорректные фильтры поиска."), 400
+    return jsonify(
+        results=[
+            {
+                "id": row["id"],
+                "title": row["title"],
+                "lot_number": row["lot_number"],
+                "is_sold": row["is_sold"],
+                "auction": {
+                    "id": row["auction_id"],
+                    "name": row["auction_name"],
+                    "starts_at": row["starts_at"].isoformat(),
+                },
+                "rank": row["rank"],
+                "title_html": str(row["title_html"]),
+                "description_html": str(row["description_html"]),
+            }
+            for row in rows
+        ]
+    )
+
+
+def _lot_state(lot, increment: Decimal) -> dict:
+    return {
+        "item_id": lot.item_id,
+        "high_bid": str(lot.high_bid) if lot.high_bid is not None else None,
+        "high_bidder_id": lot.high_bidder_id,
+        "minimum": None if lot.closed else str(lot.minimum(increment)),
+        "closed": lot.closed,
+    }
+
+
+@app.route("/items/<int:item_id>/bid", methods=["GET", "POST"])
+def bid(item_id: int):
+    """
+    GET — текущая ставка по лоту, POST — новая ставка (JSON или форма с
+    ``bidder_id`` и ``amount``). Проверка ставки идёт в памяти процесса,
+    запись в БД — в фоне пачками (см. bidding.py).
+    """
+    book = get_bid_book()
+    if request.method == "GET":
+        try:
+            lot = book.lot(item_id, get_db)
+        except LotNotFound as exc:
+            return jsonify(error=str(exc)), 404
+        return jsonify(_lot_state(lot, book.increment))
+
+    data = request.get_json(silent=True) or request.form
+    if not isinstance(data, Mapping):
+        return jsonify(error="Ожидается объект с полями bidder_id и amount."), 400
+    try:
+        bidder_id = int(data.get("bidder_id", ""))
+        amount = Decimal(str(data.get("amount", "")))
+    except (ValueError, TypeError, InvalidOperation):
+        return jsonify(error="Укажите участника и сумму ставки."), 400
+    if not amount.is_finite() or not 0 <= amount <= MAX_AMOUNT:
+        return jsonify(error="Некорректная сумма ставки."), 400
+    try:
+        placed = book.place(item_id, bidder_id, amount, get_db)
+    except LotNotFound as exc:
+        return jsonify(error=str(exc)), 404
+    except LotBusy as exc:
+        return jsonify(error=str(exc)), 503, {"Retry-After": "1"}
+    except BidRejected as exc:
+        minimum = str(exc.minimum) if exc.minimum is not None else None
+        return jsonify(error=str(exc), minimum=minimum), 409
+    return (
+        jsonify(
+            item_id=placed.item_id,
+            bidder_id=placed.bidder_id,
+            amount=str(placed.amount),
+            placed_at=placed.placed_at.isoformat(),
+            minimum=str(placed.amount + book.increment),
+        ),
+        201,
+    )
 
 
 @app.route("/reports/auction-revenue")
 def auction_revenue():
     db = get_db()
-    rows = db.query(
-        """
-        SELECT a.id,
-               a.name,
-               a.location,
-               a.starts_at,
-               COALESCE(SUM(s.sold_price), 0) AS revenue
-        FROM auctions a
-        LEFT JOIN items i ON i.auction_id = a.id
-        LEFT JOIN sales s ON s.item_id = i.id
-        GROUP BY a.id
-        ORDER BY revenue DESC, a.starts_at DESC
-        """
+    export = export_response(db, "auction_revenue", queries.AUCTION_REVENUE_SQL)
+    if export is not None:
+        return export
+    rows = db.stream(
+        queries.AUCTION_REVENUE_SQL,
+        batch_size=app.config["STREAM_BATCH_SIZE"],
+        row_factory="record",
     )
-    return render_template("auction_revenue.html", auctions=rows)
+    return stream_template("auction_revenue.html", auctions=rows)
 
 
 @app.route("/reports/sold-items")
 def sold_items():
     db = get_db()
     start, end = period_from_request()
-    rows = db.query(
-        """
-        SELECT i.title,
-               i.lot_number,
-               a.name AS auction_name,
-               s.sold_price,
-               s.sold_at,
-               buyers.name AS buyer_name
-        FROM sales s
-        JOIN items i ON i.id = s.item_id
-        JOIN auctions a ON a.id = i.auction_id
-        JOIN participants buyers ON buyers.id = s.buyer_id
-        WHERE date(s.sold_at) BETWEEN %s AND %s
-        ORDER BY s.sold_at DESC
-        """,
-        (start, end),
+    export = export_response(
+        db, "sold_items", queries.SOLD_ITEMS_SQL, queries.period_bounds(start, end)
+    )
+    if export is not None:
+        return export
+    period_sql, params = queries.period_filter("s.sold_at", start, end)
+    page = page_from_request(
+        db, queries.SOLD_ITEMS_PAGE_SQL, SOLD_ITEMS_KEYSET, [period_sql], params
+    )
+    return render_template(
+        "sold_items.html", sales=page.rows, page=page, start=start, end=end
     )
-    return render_template("sold_items.html", sales=rows, start=start, end=end)
 
 
 @app.route("/reports/seller-revenue")
 def seller_revenue():
     db = get_db()
-    start, end = period_from_request()
-    rows = db.query(
-        """
-        SELECT sellers.id,
-               sellers.name,
-               COALESCE(SUM(s.sold_price), 0) AS total
-        FROM participants sellers
-        JOIN items i ON i.seller_id = sellers.id
-        JOIN sales s ON s.item_id = i.id
-        WHERE date(s.sold_at) BETWEEN %s AND %s
-        GROUP BY sellers.id
-        ORDER BY total DESC
-        """,
-        (start, end),
+    start, end, period_warning = period_with_warning()
+    export = export_response(
+        db, "seller_revenue", queries.SELLER_REVENUE_SQL, queries.period_bounds(start, end)
     )
-    return render_template(
+    if export is not None:
+        return export
+    rows = db.stream(
+        queries.SELLER_REVENUE_SQL,
+        queries.period_bounds(start, end),
+        batch_size=app.config["STREAM_BATCH_SIZE"],
+        row_factory="record",
+    )
+    return stream_template(
         "seller_revenue.html",
         sellers=rows,
         start=start,
         end=end,
+        period_warning=period_warning,
     )
 
 
 @app.route("/reports/active-buyers")
 def buyers_in_period():
     db = get_db()
-    start, end = period_from_request()
-    rows = db.query(
-        """
-        SELECT DISTINCT buyers.id, buyers.name
-        FROM participants buyers
-        JOIN sales s ON s.buyer_id = buyers.id
-        WHERE date(s.sold_at) BETWEEN %s AND %s
-        ORDER BY buyers.name
-        """,
-        (start, end),
+    start, end, period_warning = period_with_warning()
+    export = export_response(
+        db, "buyers_in_period", queries.BUYERS_IN_PERIOD_SQL, queries.period_bounds(start, end)
     )
-    return render_template(
+    if export is not None:
+        return export
+    rows = db.stream(
+        queries.BUYERS_IN_PERIOD_SQL,
+        queries.period_bounds(start, end),
+        batch_size=app.config["STREAM_BATCH_SIZE"],
+        row_factory="record",
+    )
+    return stream_template(
         "buyers.html",
         buyers=rows,
         start=start,
         end=end,
+        period_warning=period_warning,
         include_counts=False,
     )
 
@@ -349,46 +693,48 @@ def buyers_in_period():
 @app.route("/reports/buyer-counts")
 def buyer_counts():
     db = get_db()
-    start, end = period_from_request()
-    rows = db.query(
-        """
-        SELECT buyers.id, buyers.name, COUNT(s.id) AS items_bought
-        FROM participants buyers
-        JOIN sales s ON s.buyer_id = buyers.id
-        WHERE date(s.sold_at) BETWEEN ? AND ?
-        GROUP BY buyers.id
-        ORDER BY items_bought DESC, buyers.name
-        """,
-        (start, end),
+    start, end, period_warning = period_with_warning()
+    export = export_response(
+        db, "buyer_counts", queries.BUYER_COUNTS_SQL, queries.period_bounds(start, end)
     )
-    return render_template(
+    if export is not None:
+        return export
+    rows = db.stream(
+        queries.BUYER_COUNTS_SQL,
+        queries.period_bounds(start, end),
+        batch_size=app.config["STREAM_BATCH_SIZE"],
+        row_factory="record",
+    )
+    return stream_template(
         "buyer_counts.html",
         buyers=rows,
         start=start,
         end=end,
+        period_warning=period_warning,
     )
 
 
 @app.route("/reports/sellers-participated")
 def sellers_participated():
     db = get_db()
-    start, end = period_from_request()
-    rows = db.query(
-        """
-        SELECT DISTINCT sellers.id, sellers.name
-        FROM participants sellers
-        JOIN items i ON i.seller_id = sellers.id
-        JOIN auctions a ON a.id = i.auction_id
-        WHERE date(a.starts_at) BETWEEN %s AND %s
-        ORDER BY sellers.name
-        """,
-        (start, end),
+    start, end, period_warning = period_with_warning()
+    export = export_response(
+        db, "sellers_participated", queries.SELLERS_PARTICIPATED_SQL, queries.period_bounds(start, end)
     )
-    return render_template(
+    if export is not None:
+        return export
+    rows = db.stream(
+        queries.SELLERS_PARTICIPATED_SQL,
+        queries.period_bounds(start, end),
+        batch_size=app.config["STREAM_BATCH_SIZE"],
+        row_factory="record",
+    )
+    return stream_template(
         "seller_participation.html",
         sellers=rows,
         start=start,
         end=end,
+        period_warning=period_warning,
     )
 
 
@@ -410,10 +756,11 @@ def participants():
             """,
             (name, contact, notes),
         )
+        reference_cache.invalidate("participants")
         flash("Участник добавлен.", "success")
         return redirect(url_for("participants"))
-    rows = db.query("SELECT * FROM participants ORDER BY LOWER(name)")
-    return render_template("participants.html", participants=rows)
+    page = page_from_request(db, queries.PARTICIPANTS_PAGE_SQL, PARTICIPANTS_KEYSET, [], [])
+    return render_template("participants.html", participants=page.rows, page=page)
 
 
 @app.route("/participants/<int:participant_id>/edit", methods=["GET", "POST"])
@@ -440,13 +787,13 @@ def edit_participant(participant_id: int):
             """,
             (name, contact, notes, participant_id),
         )
+        reference_cache.invalidate("participants")
         flash("Данные участника обновлены.", "success")
         return redirect(url_for("participants"))
     return render_template("edit_participant.html", participant=participant)
 
 
 if __name__ == "__main__":
-    import os
     debug_mode = os.getenv("FLASK_ENV") == "development" or os.getenv("FLASK_DEBUG") == "1"
-    app.run(host="0.0.0.0", port=5000, debug=debug_mode)
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=debug_mode)
 
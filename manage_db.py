@@ -1,8 +1,18 @@
 from __future__ import annotations
 
 import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+from typing import Iterator
 
-from db import AuctionDB
+import psycopg2
+
+import importer
+import migrations
+import queries
+from db import AuctionDB, connect
 
 
 def delete_auction(name: str) -> None:
@@ -18,6 +28,156 @@ def delete_auction(name: str) -> None:
         db.close()
 
 
+def migrate() -> None:
+    conn = connect()
+    try:
+        applied = migrations.migrate(conn)
+        if not applied:
+            print(f"Схема БД актуальна (версия {migrations.LATEST_VERSION}).")
+            return
+        for migration in applied:
+            print(f"Применена миграция {migration.version}: {migration.name}")
+    finally:
+        conn.close()
+
+
+def recount() -> None:
+    db = AuctionDB()
+    try:
+        with db.transaction():
+            db.execute("CALL stats_counters_recount()")
+            db.execute("CALL revenue_rollups_rebuild()")
+        for row in db.query("SELECT name, value FROM stats_counters ORDER BY name"):
+            print(f"{row['name']}: {row['value']}")
+    finally:
+        db.close()
+
+
+# Начиная с этого числа строк последовательное сканирование таблицы
+# в отчёте считается регрессией плана.
+LARGE_TABLE_ROWS = 10_000
+
+
+def _plan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def table_sizes(db: AuctionDB) -> dict[str, float]:
+    """Оценка числа строк основных таблиц по статистике pg_class."""
+    return {
+        row["relname"]: row["reltuples"]
+        for row in db.query(
+            """
+            SELECT relname, reltuples
+            FROM pg_class
+            WHERE relname IN ('participants', 'auctions', 'items', 'sales')
+            """
+        )
+    }
+
+
+def plan_scans(plan: dict, sizes: dict[str, float]) -> tuple[list[str], list[str]]:
+    """
+    Возвращает способы доступа к таблицам в плане (``"Index Scan on sales"``)
+    и таблицы, которые сканируются последовательно, хотя в них не меньше
+    ``LARGE_TABLE_ROWS`` строк.
+    """
+    nodes = list(_plan_nodes(plan))
+    scans = sorted(
+        {
+            f"{node['Node Type']} on {node['Relation Name']}"
+            for node in nodes
+            if "Relation Name" in node
+        }
+    )
+    seq_scans = [
+        node["Relation Name"]
+        for node in nodes
+        if node["Node Type"] == "Seq Scan"
+        and sizes.get(node["Relation Name"], 0) >= LARGE_TABLE_ROWS
+    ]
+    return scans, seq_scans
+
+
+def explain_reports(strict: bool) -> None:
+    db = AuctionDB()
+    try:
+        sizes = table_sizes(db)
+        end = date.today()
+        bounds = queries.period_bounds((end - timedelta(days=30)).isoformat(), end.isoformat())
+        problems = 0
+        for name, sql in queries.PERIOD_REPORTS.items():
+            result = db.get(f"EXPLAIN (FORMAT JSON) {sql}", bounds)["QUERY PLAN"]
+            if isinstance(result, str):
+                result = json.loads(result)
+            scans, seq_scans = plan_scans(result[0]["Plan"], sizes)
+            status = "OK" if not seq_scans else "SEQ SCAN: " + ", ".join(seq_scans)
+            print(f"{name}: {status}")
+            for scan in scans:
+                print(f"    {scan}")
+            if seq_scans:
+                problems += 1
+        if strict and problems:
+            raise SystemExit(f"Отчётов без индексного доступа: {problems}.")
+    finally:
+        db.close()
+
+
+IMPORT_LABELS = {"participants": "участников", "items": "предметы", "sales": "продажи"}
+
+
+def import_records(
+    kind: str,
+    path: str,
+    file_format: str | None,
+    dry_run: bool,
+    strict: bool,
+    errors_path: str | None,
+) -> None:
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        file_format = "ndjson" if extension in (".ndjson", ".jsonl", ".json") else "csv"
+    db = AuctionDB()
+    errors_out = open(errors_path, "w", encoding="utf-8", newline="") if errors_path else None
+    started = time.monotonic()
+    try:
+        # utf-8-sig пропускает BOM, который добавляет Excel и выгрузка отчётов.
+        with open(path, encoding="utf-8-sig", newline="") as source:
+            result = importer.import_file(
+                db.conn,
+                kind,
+                source,
+                file_format=file_format,
+                dry_run=dry_run,
+                strict=strict,
+                errors_out=errors_out,
+            )
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    except psycopg2.Error as exc:
+        # Записи разбираются до COPY, поэтому сюда доходят только ошибки БД.
+        raise SystemExit(f"Импорт прерван ошибкой БД: {str(exc).strip()}")
+    finally:
+        if errors_out is not None:
+            errors_out.close()
+        db.close()
+
+    elapsed = time.monotonic() - started
+    print(f"Записей в файле: {result.total}, с ошибками: {result.errors}.")
+    for record_no, error in result.sample:
+        print(f"    запись {record_no}: {error}")
+    if result.errors > len(result.sample):
+        print(f"    ... и ещё {result.errors - len(result.sample)}")
+    if dry_run:
+        print(f"Проверка без записи завершена за {elapsed:.1f} с.")
+    elif strict and result.errors:
+        raise SystemExit("Импорт отменён: в файле есть ошибки.")
+    else:
+        print(f"Добавлено записей: {result.inserted} за {elapsed:.1f} с.")
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Утилита для операций с аукционами.")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -25,10 +185,60 @@ def main() -> None:
     delete_parser = subparsers.add_parser("delete-auction", help="Удалить аукцион по названию.")
     delete_parser.add_argument("name", help="Название аукциона")
 
+    subparsers.add_parser("migrate", help="Применить миграции схемы БД.")
+    subparsers.add_parser("recount", help="Пересчитать счётчики главной страницы и дневные сводки выручки.")
+
+    explain_parser = subparsers.add_parser(
+        "explain-reports",
+        help="Показать планы отчётов и найти последовательные сканирования больших таблиц.",
+    )
+    explain_parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Завершиться с ошибкой, если отчёт сканирует большую таблицу целиком.",
+    )
+
+    for kind in importer.SPECS:
+        import_parser = subparsers.add_parser(
+            f"import-{kind}",
+            help=f"Загрузить {IMPORT_LABELS[kind]} из CSV с заголовком или JSON Lines "
+            f"(колонки: {', '.join(importer.SPECS[kind].columns)}).",
+        )
+        import_parser.add_argument("file", help="Путь к файлу")
+        import_parser.add_argument(
+            "--format",
+            choices=importer.FORMATS,
+            help="Формат файла (по умолчанию определяется по расширению).",
+        )
+        import_parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только проверить файл, ничего не записывая.",
+        )
+        import_parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Не загружать ничего, если хотя бы одна запись с ошибкой.",
+        )
+        import_parser.add_argument(
+            "--errors",
+            metavar="FILE",
+            help="Сохранить все ошибки в CSV (номер записи, текст ошибки).",
+        )
+        import_parser.set_defaults(kind=kind)
+
     args = parser.parse_args()
 
     if args.command == "delete-auction":
         delete_auction(args.name)
+    elif args.command == "migrate":
+        migrate()
+    elif args.command == "recount":
+        recount()
+    elif args.command == "explain-reports":
+        explain_reports(args.strict)
+    elif args.command.startswith("import-"):
+        import_records(args.kind, args.file, args.format, args.dry_run, args.strict, args.errors)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,789 @@
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any, NamedTuple
+
+# Произвольный ключ advisory-блокировки, чтобы несколько процессов
+# не применяли миграции одновременно.
+MIGRATION_LOCK_KEY = 7_352_001
+
+# Имя индекса в CREATE INDEX CONCURRENTLY IF NOT EXISTS: после сбоя такой
+# команды остаётся недействительный (INVALID) индекс, который IF NOT EXISTS
+# при повторе пропустил бы.
+_CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: tuple[str, ...]
+    # CREATE INDEX CONCURRENTLY и подобные команды нельзя выполнять в транзакции.
+    transactional: bool = True
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        1,
+        "initial schema",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS participants (
+                id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL,
+                contact_info TEXT,
+                notes TEXT
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS auctions (
+                id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL,
+                location TEXT NOT NULL,
+                starts_at TIMESTAMP NOT NULL,
+                description TEXT
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                id SERIAL PRIMARY KEY,
+                auction_id INTEGER NOT NULL REFERENCES auctions(id) ON DELETE CASCADE,
+                seller_id INTEGER NOT NULL REFERENCES participants(id),
+                lot_number TEXT NOT NULL,
+                title TEXT NOT NULL,
+                start_price NUMERIC(12, 2) NOT NULL CHECK (start_price >= 0),
+                description TEXT,
+                UNIQUE (auction_id, lot_number)
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS sales (
+                id SERIAL PRIMARY KEY,
+                item_id INTEGER NOT NULL UNIQUE REFERENCES items(id) ON DELETE CASCADE,
+                buyer_id INTEGER NOT NULL REFERENCES participants(id),
+                sold_price NUMERIC(12, 2) NOT NULL CHECK (sold_price >= 0),
+                sold_at TIMESTAMP NOT NULL
+            );
+            """,
+        ),
+    ),
+    Migration(
+        2,
+        "report indexes",
+        (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS items_seller_id_idx ON items (seller_id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS sales_buyer_id_idx ON sales (buyer_id)",
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS sales_sold_at_covering_idx
+            ON sales (sold_at) INCLUDE (sold_price, buyer_id, item_id)
+            """,
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS auctions_starts_at_idx ON auctions (starts_at)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS auctions_location_idx ON auctions (location)",
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS participants_lower_name_idx
+            ON participants (LOWER(name), id)
+            """,
+        ),
+        transactional=False,
+    ),
+    Migration(
+        3,
+        "stats counters",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                name TEXT PRIMARY KEY,
+                value NUMERIC NOT NULL DEFAULT 0
+            );
+            """,
+            """
+            CREATE OR REPLACE PROCEDURE stats_counters_recount() AS $$
+            BEGIN
+                LOCK TABLE participants, auctions, items, sales IN SHARE MODE;
+                INSERT INTO stats_counters (name, value)
+                VALUES ('participants', (SELECT COUNT(*) FROM participants)),
+                       ('auctions', (SELECT COUNT(*) FROM auctions)),
+                       ('items', (SELECT COUNT(*) FROM items)),
+                       ('sales', (SELECT COUNT(*) FROM sales)),
+                       ('revenue', (SELECT COALESCE(SUM(sold_price), 0) FROM sales))
+                ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION stats_counters_track() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE stats_counters SET value = value + 1 WHERE name = TG_TABLE_NAME;
+                    IF TG_TABLE_NAME = 'sales' THEN
+                        UPDATE stats_counters SET value = value + NEW.sold_price
+                        WHERE name = 'revenue';
+                    END IF;
+                    RETURN NEW;
+                ELSIF TG_OP = 'DELETE' THEN
+                    UPDATE stats_counters SET value = value - 1 WHERE name = TG_TABLE_NAME;
+                    IF TG_TABLE_NAME = 'sales' THEN
+                        UPDATE stats_counters SET value = value - OLD.sold_price
+                        WHERE name = 'revenue';
+                    END IF;
+                    RETURN OLD;
+                END IF;
+                UPDATE stats_counters SET value = value + NEW.sold_price - OLD.sold_price
+                WHERE name = 'revenue';
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION stats_counters_reset() RETURNS trigger AS $$
+            BEGIN
+                UPDATE stats_counters SET value = 0
+                WHERE name = TG_TABLE_NAME
+                   OR (TG_TABLE_NAME = 'sales' AND name = 'revenue');
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            DO $$
+            DECLARE
+                tbl TEXT;
+            BEGIN
+                FOREACH tbl IN ARRAY ARRAY['participants', 'auctions', 'items', 'sales'] LOOP
+                    EXECUTE format(
+                        'CREATE TRIGGER %I AFTER INSERT OR DELETE ON %I
+                         FOR EACH ROW EXECUTE FUNCTION stats_counters_track()',
+                        tbl || '_stats_track', tbl
+                    );
+                    EXECUTE format(
+                        'CREATE TRIGGER %I AFTER TRUNCATE ON %I
+                         FOR EACH STATEMENT EXECUTE FUNCTION stats_counters_reset()',
+                        tbl || '_stats_reset', tbl
+                    );
+                END LOOP;
+            END;
+            $$;
+            """,
+            """
+            CREATE TRIGGER sales_stats_revenue AFTER UPDATE OF sold_price ON sales
+            FOR EACH ROW EXECUTE FUNCTION stats_counters_track();
+            """,
+            "CALL stats_counters_recount()",
+        ),
+    ),
+    Migration(
+        4,
+        "keyset pagination indexes",
+        (
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS auctions_starts_at_id_idx
+            ON auctions (starts_at, id)
+            """,
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS sales_sold_at_id_idx ON sales (sold_at, id)",
+            # Покрывается индексом (starts_at, id).
+            "DROP INDEX CONCURRENTLY IF EXISTS auctions_starts_at_idx",
+        ),
+        transactional=False,
+    ),
+    Migration(
+        5,
+        "daily revenue rollups",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS revenue_by_auction_day (
+                auction_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                revenue NUMERIC NOT NULL DEFAULT 0,
+                sales_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (auction_id, day)
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS revenue_by_seller_day (
+                day DATE NOT NULL,
+                seller_id INTEGER NOT NULL,
+                revenue NUMERIC NOT NULL DEFAULT 0,
+                sales_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, seller_id)
+            );
+            """,
+            """
+            CREATE OR REPLACE FUNCTION revenue_rollups_add(
+                p_auction_id INTEGER,
+                p_seller_id INTEGER,
+                p_day DATE,
+                p_amount NUMERIC,
+                p_count INTEGER
+            ) RETURNS void AS $$
+            BEGIN
+                INSERT INTO revenue_by_auction_day AS r (auction_id, day, revenue, sales_count)
+                VALUES (p_auction_id, p_day, p_amount, p_count)
+                ON CONFLICT (auction_id, day) DO UPDATE
+                SET revenue = r.revenue + EXCLUDED.revenue,
+                    sales_count = r.sales_count + EXCLUDED.sales_count;
+                INSERT INTO revenue_by_seller_day AS r (day, seller_id, revenue, sales_count)
+                VALUES (p_day, p_seller_id, p_amount, p_count)
+                ON CONFLICT (day, seller_id) DO UPDATE
+                SET revenue = r.revenue + EXCLUDED.revenue,
+                    sales_count = r.sales_count + EXCLUDED.sales_count;
+                IF p_count < 0 THEN
+                    DELETE FROM revenue_by_auction_day
+                    WHERE auction_id = p_auction_id AND day = p_day AND sales_count <= 0;
+                    DELETE FROM revenue_by_seller_day
+                    WHERE day = p_day AND seller_id = p_seller_id AND sales_count <= 0;
+                END IF;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION revenue_rollups_track_sale() RETURNS trigger AS $$
+            DECLARE
+                item RECORD;
+            BEGIN
+                -- Если предмет уже удалён (каскадное удаление), его продажу
+                -- вычел триггер на items.
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    SELECT auction_id, seller_id INTO item FROM items WHERE id = OLD.item_id;
+                    IF FOUND THEN
+                        PERFORM revenue_rollups_add(
+                            item.auction_id, item.seller_id, OLD.sold_at::date, -OLD.sold_price, -1
+                        );
+                    END IF;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    SELECT auction_id, seller_id INTO item FROM items WHERE id = NEW.item_id;
+                    PERFORM revenue_rollups_add(
+                        item.auction_id, item.seller_id, NEW.sold_at::date, NEW.sold_price, 1
+                    );
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION revenue_rollups_track_item() RETURNS trigger AS $$
+            DECLARE
+                sale RECORD;
+            BEGIN
+                SELECT sold_price, sold_at INTO sale FROM sales WHERE item_id = OLD.id;
+                IF FOUND THEN
+                    PERFORM revenue_rollups_add(
+                        OLD.auction_id, OLD.seller_id, sale.sold_at::date, -sale.sold_price, -1
+                    );
+                    IF TG_OP = 'UPDATE' THEN
+                        PERFORM revenue_rollups_add(
+                            NEW.auction_id, NEW.seller_id, sale.sold_at::date, sale.sold_price, 1
+                        );
+                    END IF;
+                END IF;
+                IF TG_OP = 'DELETE' THEN
+                    RETURN OLD;
+                END IF;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION revenue_rollups_reset() RETURNS trigger AS $$
+            BEGIN
+                DELETE FROM revenue_by_auction_day;
+                DELETE FROM revenue_by_seller_day;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE OR REPLACE PROCEDURE revenue_rollups_rebuild() AS $$
+            BEGIN
+                LOCK TABLE items, sales IN SHARE MODE;
+                DELETE FROM revenue_by_auction_day;
+                DELETE FROM revenue_by_seller_day;
+                INSERT INTO revenue_by_auction_day (auction_id, day, revenue, sales_count)
+                SELECT i.auction_id, s.sold_at::date, SUM(s.sold_price), COUNT(*)
+                FROM sales s
+                JOIN items i ON i.id = s.item_id
+                GROUP BY 1, 2;
+                INSERT INTO revenue_by_seller_day (day, seller_id, revenue, sales_count)
+                SELECT s.sold_at::date, i.seller_id, SUM(s.sold_price), COUNT(*)
+                FROM sales s
+                JOIN items i ON i.id = s.item_id
+                GROUP BY 1, 2;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE TRIGGER sales_revenue_rollups
+            AFTER INSERT OR UPDATE OF item_id, sold_price, sold_at OR DELETE ON sales
+            FOR EACH ROW EXECUTE FUNCTION revenue_rollups_track_sale();
+            """,
+            """
+            CREATE TRIGGER items_revenue_rollups
+            BEFORE DELETE OR UPDATE OF auction_id, seller_id ON items
+            FOR EACH ROW EXECUTE FUNCTION revenue_rollups_track_item();
+            """,
+            """
+            CREATE TRIGGER sales_revenue_rollups_reset AFTER TRUNCATE ON sales
+            FOR EACH STATEMENT EXECUTE FUNCTION revenue_rollups_reset();
+            """,
+            "CALL revenue_rollups_rebuild()",
+        ),
+    ),
+    Migration(
+        6,
+        "items sold flag",
+        (
+            "ALTER TABLE items ADD COLUMN IF NOT EXISTS is_sold BOOLEAN NOT NULL DEFAULT FALSE",
+            """
+            CREATE OR REPLACE FUNCTION items_track_sold() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    UPDATE items SET is_sold = FALSE WHERE id = OLD.item_id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    UPDATE items SET is_sold = TRUE WHERE id = NEW.item_id;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE TRIGGER sales_items_sold
+            AFTER INSERT OR UPDATE OF item_id OR DELETE ON sales
+            FOR EACH ROW EXECUTE FUNCTION items_track_sold();
+            """,
+            "UPDATE items SET is_sold = TRUE WHERE id IN (SELECT item_id FROM sales)",
+        ),
+    ),
+    Migration(
+        7,
+        "unsold items index",
+        (
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS items_unsold_idx
+            ON items (auction_id, id) INCLUDE (title, lot_number)
+            WHERE NOT is_sold
+            """,
+        ),
+        transactional=False,
+    ),
+    Migration(
+        8,
+        "typeahead search indexes",
+        (
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            # Триграммы ищут подстроку, text_pattern_ops — короткие префиксы.
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS participants_name_trgm_idx
+            ON participants USING gin (LOWER(name) gin_trgm_ops)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS participants_name_prefix_idx
+            ON participants (LOWER(name) text_pattern_ops)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS auctions_name_trgm_idx
+            ON auctions USING gin (LOWER(name) gin_trgm_ops)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS auctions_name_prefix_idx
+            ON auctions (LOWER(name) text_pattern_ops)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS items_unsold_title_trgm_idx
+            ON items USING gin (LOWER(title) gin_trgm_ops)
+            WHERE NOT is_sold
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS items_unsold_title_prefix_idx
+            ON items (LOWER(title) text_pattern_ops)
+            WHERE NOT is_sold
+            """,
+        ),
+        transactional=False,
+    ),
+    Migration(
+        9,
+        "items full-text search vector",
+        (
+            # Название весит больше описания: совпадения в нём выше в выдаче.
+            """
+            ALTER TABLE items ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('russian', COALESCE(title, '')), 'A')
+                || setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+            ) STORED
+            """,
+        ),
+    ),
+    Migration(
+        10,
+        "items full-text search index",
+        (
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS items_search_vector_idx
+            ON items USING gin (search_vector)
+            """,
+        ),
+        transactional=False,
+    ),
+    Migration(
+        11,
+        "statement-level insert triggers",
+        (
+            # Построчные триггеры на INSERT обновляли одну и ту же строку
+            # stats_counters (и сводки) на каждую вставленную строку; при
+            # массовой загрузке это главный источник затрат. Теперь вставка
+            # обрабатывается один раз на оператор через таблицу переходов.
+            """
+            CREATE OR REPLACE FUNCTION stats_counters_track_insert() RETURNS trigger AS $$
+            BEGIN
+                UPDATE stats_counters SET value = value + (SELECT COUNT(*) FROM new_rows)
+                WHERE name = TG_TABLE_NAME;
+                IF TG_TABLE_NAME = 'sales' THEN
+                    UPDATE stats_counters
+                    SET value = value + (SELECT COALESCE(SUM(sold_price), 0) FROM new_rows)
+                    WHERE name = 'revenue';
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            DO $$
+            DECLARE
+                tbl TEXT;
+            BEGIN
+                FOREACH tbl IN ARRAY ARRAY['participants', 'auctions', 'items', 'sales'] LOOP
+                    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_stats_track', tbl);
+                    EXECUTE format(
+                        'CREATE TRIGGER %I AFTER DELETE ON %I
+                         FOR EACH ROW EXECUTE FUNCTION stats_counters_track()',
+                        tbl || '_stats_track', tbl
+                    );
+                    EXECUTE format(
+                        'CREATE TRIGGER %I AFTER INSERT ON %I
+                         REFERENCING NEW TABLE AS new_rows
+                         FOR EACH STATEMENT EXECUTE FUNCTION stats_counters_track_insert()',
+                        tbl || '_stats_track_insert', tbl
+                    );
+                END LOOP;
+            END;
+            $$;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION sales_track_insert() RETURNS trigger AS $$
+            BEGIN
+                UPDATE items SET is_sold = TRUE WHERE id IN (SELECT item_id FROM new_rows);
+                INSERT INTO revenue_by_auction_day AS r (auction_id, day, revenue, sales_count)
+                SELECT i.auction_id, n.sold_at::date, SUM(n.sold_price), COUNT(*)
+                FROM new_rows n
+                JOIN items i ON i.id = n.item_id
+                GROUP BY 1, 2
+                ON CONFLICT (auction_id, day) DO UPDATE
+                SET revenue = r.revenue + EXCLUDED.revenue,
+                    sales_count = r.sales_count + EXCLUDED.sales_count;
+                INSERT INTO revenue_by_seller_day AS r (day, seller_id, revenue, sales_count)
+                SELECT n.sold_at::date, i.seller_id, SUM(n.sold_price), COUNT(*)
+                FROM new_rows n
+                JOIN items i ON i.id = n.item_id
+                GROUP BY 1, 2
+                ON CONFLICT (day, seller_id) DO UPDATE
+                SET revenue = r.revenue + EXCLUDED.revenue,
+                    sales_count = r.sales_count + EXCLUDED.sales_count;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            "DROP TRIGGER IF EXISTS sales_items_sold ON sales",
+            """
+            CREATE TRIGGER sales_items_sold
+            AFTER UPDATE OF item_id OR DELETE ON sales
+            FOR EACH ROW EXECUTE FUNCTION items_track_sold();
+            """,
+            "DROP TRIGGER IF EXISTS sales_revenue_rollups ON sales",
+            """
+            CREATE TRIGGER sales_revenue_rollups
+            AFTER UPDATE OF item_id, sold_price, sold_at OR DELETE ON sales
+            FOR EACH ROW EXECUTE FUNCTION revenue_rollups_track_sale();
+            """,
+            """
+            CREATE TRIGGER sales_track_insert AFTER INSERT ON sales
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION sales_track_insert();
+            """,
+        ),
+    ),
+    Migration(
+        12,
+        "bids",
+        (
+            # Ставки принимает книга ставок в памяти процесса (bidding.py) и
+            # дописывает сюда пачками; таблица только для истории и для
+            # восстановления текущей ставки после перезапуска.
+            """
+            CREATE TABLE IF NOT EXISTS bids (
+                id BIGSERIAL PRIMARY KEY,
+                item_id INTEGER NOT NULL REFERENCES items(id) ON DELETE CASCADE,
+                bidder_id INTEGER NOT NULL REFERENCES participants(id),
+                amount NUMERIC(12, 2) NOT NULL CHECK (amount >= 0),
+                placed_at TIMESTAMP NOT NULL
+            );
+            """,
+            "CREATE INDEX IF NOT EXISTS bids_item_amount_idx ON bids (item_id, amount DESC, id)",
+            "CREATE INDEX IF NOT EXISTS bids_bidder_id_idx ON bids (bidder_id)",
+        ),
+    ),
+    Migration(
+        13,
+        "auction event notifications",
+        (
+            # События торгов для events.py: NOTIFY на канал auction_events с
+            # JSON-объектом, в котором всегда есть type и auction_id. Триггеры
+            # уровня оператора, а размер сообщения ограничен: массовая вставка
+            # отправляет списки id пачками по 500, а не событие на строку.
+            """
+            CREATE OR REPLACE FUNCTION auction_events_bids() RETURNS trigger AS $$
+            BEGIN
+                -- Из пачки ставок по лоту важна только наибольшая.
+                PERFORM pg_notify('auction_events', json_build_object(
+                    'type', 'bid',
+                    'auction_id', i.auction_id,
+                    'item_id', b.item_id,
+                    'amount', b.amount,
+                    'bidder_id', b.bidder_id,
+                    'placed_at', b.placed_at,
+                    'bids', b.bids
+                )::text)
+                FROM (
+                    SELECT DISTINCT ON (item_id)
+                           item_id, amount, bidder_id, placed_at,
+                           COUNT(*) OVER (PARTITION BY item_id) AS bids
+                    FROM new_rows
+                    ORDER BY item_id, amount DESC, id DESC
+                ) b
+                JOIN items i ON i.id = b.item_id;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION auction_events_sales() RETURNS trigger AS $$
+            BEGIN
+                IF (SELECT COUNT(*) FROM new_rows) <= 100 THEN
+                    PERFORM pg_notify('auction_events', json_build_object(
+                        'type', 'sale',
+                        'auction_id', i.auction_id,
+                        'item_id', n.item_id,
+                        'lot_number', i.lot_number,
+                        'sold_price', n.sold_price,
+                        'buyer_id', n.buyer_id,
+                        'sold_at', n.sold_at
+                    )::text)
+                    FROM new_rows n
+                    JOIN items i ON i.id = n.item_id;
+                ELSE
+                    PERFORM pg_notify('auction_events', json_build_object(
+                        'type', 'sales', 'auction_id', auction_id, 'item_ids', json_agg(item_id)
+                    )::text)
+                    FROM (
+                        SELECT i.auction_id,
+                               n.item_id,
+                               (ROW_NUMBER() OVER (PARTITION BY i.auction_id ORDER BY n.item_id) - 1)
+                                   / 500 AS chunk
+                        FROM new_rows n
+                        JOIN items i ON i.id = n.item_id
+                    ) s
+                    GROUP BY auction_id, chunk;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            # TG_ARGV[0] — тип события; строки берутся из таблицы переходов
+            # changed_rows (новые строки для INSERT, удалённые для DELETE).
+            """
+            CREATE OR REPLACE FUNCTION auction_events_items() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify('auction_events', json_build_object(
+                    'type', TG_ARGV[0], 'auction_id', auction_id, 'item_ids', json_agg(id)
+                )::text)
+                FROM (
+                    SELECT auction_id,
+                           id,
+                           (ROW_NUMBER() OVER (PARTITION BY auction_id ORDER BY id) - 1) / 500 AS chunk
+                    FROM changed_rows
+                ) s
+                GROUP BY auction_id, chunk;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            "DROP TRIGGER IF EXISTS bids_events ON bids",
+            """
+            CREATE TRIGGER bids_events AFTER INSERT ON bids
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION auction_events_bids();
+            """,
+            "DROP TRIGGER IF EXISTS sales_events ON sales",
+            """
+            CREATE TRIGGER sales_events AFTER INSERT ON sales
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION auction_events_sales();
+            """,
+            "DROP TRIGGER IF EXISTS items_events_insert ON items",
+            """
+            CREATE TRIGGER items_events_insert AFTER INSERT ON items
+            REFERENCING NEW TABLE AS changed_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION auction_events_items('lots_opened');
+            """,
+            "DROP TRIGGER IF EXISTS items_events_delete ON items",
+            """
+            CREATE TRIGGER items_events_delete AFTER DELETE ON items
+            REFERENCING OLD TABLE AS changed_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION auction_events_items('lots_closed');
+            """,
+        ),
+    ),
+    Migration(
+        14,
+        "typeahead knn indexes",
+        (
+            # GiST-индекс отвечает и на LIKE, и на ORDER BY ... <-> ... LIMIT
+            # (поиск ближайших), поэтому GIN-индексы миграции 8 больше не нужны.
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS participants_name_trgm_gist_idx
+            ON participants USING gist (LOWER(name) gist_trgm_ops)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS auctions_name_trgm_gist_idx
+            ON auctions USING gist (LOWER(name) gist_trgm_ops)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS items_unsold_title_trgm_gist_idx
+            ON items USING gist (LOWER(title) gist_trgm_ops)
+            WHERE NOT is_sold
+            """,
+            "DROP INDEX CONCURRENTLY IF EXISTS participants_name_trgm_idx",
+            "DROP INDEX CONCURRENTLY IF EXISTS auctions_name_trgm_idx",
+            "DROP INDEX CONCURRENTLY IF EXISTS items_unsold_title_trgm_idx",
+        ),
+        transactional=False,
+    ),
+]
+
+LATEST_VERSION = max(m.version for m in MIGRATIONS)
+
+_verified = False
+_verify_lock = threading.Lock()
+
+
+def _ensure_migrations_table(conn: Any) -> None:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+        """
+    )
+    conn.commit()
+
+
+def applied_versions(conn: Any) -> set[int]:
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('schema_migrations') AS t")
+    if cur.fetchone()["t"] is None:
+        conn.rollback()
+        return set()
+    cur.execute("SELECT version FROM schema_migrations")
+    versions = {row["version"] for row in cur.fetchall()}
+    conn.rollback()
+    return versions
+
+
+def pending_migrations(conn: Any) -> list[Migration]:
+    applied = applied_versions(conn)
+    return [m for m in sorted(MIGRATIONS) if m.version not in applied]
+
+
+def _index_invalid(cur: Any, name: str) -> bool:
+    cur.execute(
+        "SELECT NOT indisvalid AS invalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+        (name,),
+    )
+    row = cur.fetchone()
+    return row is not None and row["invalid"]
+
+
+def _apply(conn: Any, migration: Migration) -> None:
+    cur = conn.cursor()
+    if migration.transactional:
+        for statement in migration.statements:
+            cur.execute(statement)
+        cur.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+            (migration.version, migration.name),
+        )
+        conn.commit()
+        return
+
+    conn.autocommit = True
+    try:
+        for statement in migration.statements:
+            index = _CONCURRENT_INDEX.search(statement)
+            if index is not None and _index_invalid(cur, index.group(1)):
+                # Остаток прерванного CREATE INDEX CONCURRENTLY: строим заново.
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index.group(1)}")
+            cur.execute(statement)
+            if index is not None and _index_invalid(cur, index.group(1)):
+                raise RuntimeError(
+                    f"Индекс {index.group(1)} недействителен после миграции {migration.version}."
+                )
+        cur.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+            (migration.version, migration.name),
+        )
+    finally:
+        conn.autocommit = False
+
+
+def migrate(conn: Any) -> list[Migration]:
+    """Применяет все ещё не применённые миграции и возвращает их список."""
+    _ensure_migrations_table(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    conn.commit()
+    try:
+        pending = pending_migrations(conn)
+        for migration in pending:
+            try:
+                _apply(conn, migration)
+            except Exception:
+                conn.rollback()
+                raise
+        return pending
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        conn.commit()
+
+
+def ensure_schema(conn: Any) -> None:
+    """
+    Проверяет, что схема БД актуальна, и при необходимости применяет миграции.
+
+    Проверка выполняется один раз на процесс: последующие вызовы
+    не обращаются к БД.
+    """
+    global _verified
+    if _verified:
+        return
+    with _verify_lock:
+        if _verified:
+            return
+        if pending_migrations(conn):
+            migrate(conn)
+        _verified = True
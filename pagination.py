@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, NamedTuple
+
+
+class Keyset(NamedTuple):
+    # SQL-выражения ключа сортировки и уникального id, например "LOWER(name)" и "id".
+    key_sql: str
+    id_sql: str
+    # Поля строки результата, из которых берутся значения курсора.
+    key_field: str
+    id_field: str
+    descending: bool = False
+    # Тип ключа: "text" или "timestamp"; по нему проверяется курсор из URL.
+    key_type: str = "text"
+
+
+# Диапазон BIGINT: id из курсора вне его PostgreSQL не сравнит с колонкой.
+MIN_ID = -(2**63)
+MAX_ID = 2**63 - 1
+
+
+class Page(NamedTuple):
+    rows: list[dict]
+    next_cursor: str | None
+    prev_cursor: str | None
+
+
+def encode_cursor(row: dict, keyset: Keyset) -> str:
+    key = row[keyset.key_field]
+    if hasattr(key, "isoformat"):
+        key = key.isoformat()
+    payload = json.dumps([key, row[keyset.id_field]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, keyset: Keyset) -> tuple[Any, int]:
+    """
+    Разбирает курсор из URL и проверяет его значения по типу ключа
+    ``keyset``; при некорректном значении выбрасывает ``ValueError``.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        key, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise ValueError("Некорректный курсор страницы.") from exc
+    if (
+        isinstance(row_id, bool)
+        or not isinstance(row_id, int)
+        or not MIN_ID <= row_id <= MAX_ID
+        or not isinstance(key, str)
+        or "\x00" in key
+    ):
+        raise ValueError("Некорректный курсор страницы.")
+    if keyset.key_type == "timestamp":
+        try:
+            key = datetime.fromisoformat(key)
+        except ValueError as exc:
+            raise ValueError("Некорректный курсор страницы.") from exc
+    return key, row_id
+
+
+def paginate(
+    db: Any,
+    sql: str,
+    keyset: Keyset,
+    where: list[str],
+    params: list[Any],
+    page_size: int,
+    after: str | None = None,
+    before: str | None = None,
+) -> Page:
+    """
+    Возвращает страницу строк с keyset-пагинацией.
+
+    ``sql`` должен содержать плейсхолдеры ``{where}`` и ``{order}`` и
+    заканчиваться на ``LIMIT %s``. Страница ищется сравнением
+    ``(ключ, id)`` со значениями курсора, поэтому при наличии индекса
+    по ``(ключ, id)`` глубокие страницы стоят столько же, сколько первая.
+    """
+    where = list(where)
+    params = list(params)
+    backwards = False
+    cursor = before or after
+    if cursor:
+        key, row_id = decode_cursor(cursor, keyset)
+        backwards = bool(before)
+        # Для обратного направления сравнение и сортировка инвертируются.
+        op = "<" if keyset.descending != backwards else ">"
+        where.append(f"({keyset.key_sql}, {keyset.id_sql}) {op} (%s, %s)")
+        params.extend([key, row_id])
+
+    direction = "DESC" if keyset.descending != backwards else "ASC"
+    order = f"{keyset.key_sql} {direction}, {keyset.id_sql} {direction}"
+    where_sql = " AND ".join(where) if where else "TRUE"
+    rows = db.query(sql.format(where=where_sql, order=order), [*params, page_size + 1])
+
+    has_more = len(rows) > page_size
+    rows = list(rows[:page_size])
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return Page(rows, None, None)
+
+    first = encode_cursor(rows[0], keyset)
+    last = encode_cursor(rows[-1], keyset)
+    if backwards:
+        return Page(rows, last, first if has_more else None)
+    return Page(rows, last if has_more else None, first if cursor else None)
@@ -0,0 +1,345 @@
+from datetime import date, timedelta
+from typing import Any
+
+
+def period_bounds(start: str, end: str) -> tuple[date, date]:
+    """
+    Преобразует даты периода (включительно, ISO-формат) в полуинтервал
+    ``[start, end + 1 день)`` для сравнения с колонками TIMESTAMP.
+
+    Сравнение колонки напрямую, без ``date(...)``, позволяет использовать
+    индекс по ней. При некорректных датах выбрасывает ``ValueError``.
+    """
+    period_start = date.fromisoformat(start)
+    period_end = date.fromisoformat(end)
+    if period_start > period_end:
+        raise ValueError("Дата начала периода позже даты окончания.")
+    return period_start, period_end + timedelta(days=1)
+
+
+def period_filter(column: str, start: str, end: str) -> tuple[str, list[Any]]:
+    """Возвращает условие WHERE по периоду для колонки ``column`` и его параметры."""
+    period_start, period_end = period_bounds(start, end)
+    return f"{column} >= %s AND {column} < %s", [period_start, period_end]
+
+
+UPCOMING_AUCTIONS_SQL = """
+    SELECT id, name, location, starts_at, description
+    FROM auctions
+    ORDER BY starts_at
+    LIMIT 5
+"""
+
+# Выручка читается из дневных сводок (миграция 5), которые обновляются
+# триггерами при каждой продаже.
+TOP_SELLERS_SQL = """
+    SELECT p.name, r.total
+    FROM (
+        SELECT seller_id, SUM(revenue) AS total
+        FROM revenue_by_seller_day
+        GROUP BY seller_id
+        ORDER BY total DESC
+        LIMIT 5
+    ) r
+    JOIN participants p ON p.id = r.seller_id
+    ORDER BY r.total DESC
+"""
+
+# Счётчики поддерживаются триггерами (миграция 3), поэтому запрос читает
+# несколько строк вместо полного сканирования таблиц.
+DASHBOARD_TOTALS_SQL = """
+    SELECT COALESCE(MAX(value) FILTER (WHERE name = 'auctions'), 0)::bigint AS auctions,
+           COALESCE(MAX(value) FILTER (WHERE name = 'participants'), 0)::bigint AS participants,
+           COALESCE(MAX(value) FILTER (WHERE name = 'items'), 0)::bigint AS items_count,
+           COALESCE(MAX(value) FILTER (WHERE name = 'sales'), 0)::bigint AS sales,
+           COALESCE(MAX(value) FILTER (WHERE name = 'revenue'), 0) AS revenue
+    FROM stats_counters
+"""
+
+# Все данные главной страницы одним запросом: списки упакованы в JSON.
+# Суммы передаются строкой: числа JSON разбираются во float и теряют копейки.
+DASHBOARD_BATCH_SQL = f"""
+    SELECT totals.*,
+           (SELECT COALESCE(json_agg(u ORDER BY u.starts_at), '[]'::json)
+            FROM ({UPCOMING_AUCTIONS_SQL}) u) AS upcoming,
+           (SELECT COALESCE(json_agg(json_build_object('name', t.name, 'total', t.total::text)
+                                     ORDER BY t.total DESC), '[]'::json)
+            FROM ({TOP_SELLERS_SQL}) t) AS top_sellers
+    FROM ({DASHBOARD_TOTALS_SQL}) totals
+"""
+
+# Постраничные списки: {where} и {order} подставляет pagination.paginate.
+AUCTIONS_PAGE_SQL = """
+    SELECT id, name, location, starts_at, description
+    FROM auctions
+    WHERE {where}
+    ORDER BY {order}
+    LIMIT %s
+"""
+
+PARTICIPANTS_PAGE_SQL = """
+    SELECT id, name, contact_info, notes, LOWER(name) AS sort_name
+    FROM participants
+    WHERE {where}
+    ORDER BY {order}
+    LIMIT %s
+"""
+
+SOLD_ITEMS_PAGE_SQL = """
+    SELECT s.id,
+           i.title,
+           i.lot_number,
+           a.name AS auction_name,
+           s.sold_price,
+           s.sold_at,
+           buyers.name AS buyer_name
+    FROM sales s
+    JOIN items i ON i.id = s.item_id
+    JOIN auctions a ON a.id = i.auction_id
+    JOIN participants buyers ON buyers.id = s.buyer_id
+    WHERE {where}
+    ORDER BY {order}
+    LIMIT %s
+"""
+
+AUCTION_LOCATIONS_SQL = (
+    "SELECT location FROM auctions GROUP BY location ORDER BY LOWER(location)"
+)
+
+FORM_AVAILABILITY_SQL = """
+    SELECT EXISTS (SELECT 1 FROM auctions) AS has_auctions,
+           EXISTS (SELECT 1 FROM participants) AS has_participants,
+           EXISTS (SELECT 1 FROM items WHERE NOT is_sold) AS has_unsold_items
+"""
+
+# Поиск для автодополнения (миграции 8 и 14). Параметры: pattern — шаблон
+# LIKE (подстрока или префикс), prefix — префикс для ранжирования, q — строка
+# запроса, limit — число результатов. Совпадения по префиксу идут первыми,
+# затем — более похожие на запрос. Кандидатов выбирает GiST-индекс по
+# расстоянию ``<->`` (1 - similarity): limit ближайших совпадений по префиксу и
+# limit ближайших по подстроке; вместе они содержат первые limit строк
+# итогового порядка, и ранжировать все совпадения не нужно.
+SEARCH_PARTICIPANTS_SQL = """
+    WITH candidates AS (
+        (SELECT id, name
+         FROM participants
+         WHERE LOWER(name) LIKE %(prefix)s
+         ORDER BY LOWER(name) <-> %(q)s
+         LIMIT %(limit)s)
+        UNION
+        (SELECT id, name
+         FROM participants
+         WHERE LOWER(name) LIKE %(pattern)s
+         ORDER BY LOWER(name) <-> %(q)s
+         LIMIT %(limit)s)
+    )
+    SELECT id, name
+    FROM candidates
+    ORDER BY LOWER(name) LIKE %(prefix)s DESC,
+             similarity(LOWER(name), %(q)s) DESC,
+             LOWER(name),
+             id
+    LIMIT %(limit)s
+"""
+
+SEARCH_AUCTIONS_SQL = """
+    WITH candidates AS (
+        (SELECT id, name, starts_at
+         FROM auctions
+         WHERE LOWER(name) LIKE %(prefix)s
+         ORDER BY LOWER(name) <-> %(q)s
+         LIMIT %(limit)s)
+        UNION
+        (SELECT id, name, starts_at
+         FROM auctions
+         WHERE LOWER(name) LIKE %(pattern)s
+         ORDER BY LOWER(name) <-> %(q)s
+         LIMIT %(limit)s)
+    )
+    SELECT id, name, starts_at
+    FROM candidates
+    ORDER BY LOWER(name) LIKE %(prefix)s DESC,
+             similarity(LOWER(name), %(q)s) DESC,
+             starts_at DESC,
+             id
+    LIMIT %(limit)s
+"""
+
+SEARCH_UNSOLD_ITEMS_SQL = """
+    WITH candidates AS (
+        (SELECT id, title, lot_number, auction_id
+         FROM items
+         WHERE NOT is_sold
+           AND LOWER(title) LIKE %(prefix)s
+         ORDER BY LOWER(title) <-> %(q)s
+         LIMIT %(limit)s)
+        UNION
+        (SELECT id, title, lot_number, auction_id
+         FROM items
+         WHERE NOT is_sold
+           AND LOWER(title) LIKE %(pattern)s
+         ORDER BY LOWER(title) <-> %(q)s
+         LIMIT %(limit)s)
+    )
+    SELECT i.id,
+           i.title,
+           i.lot_number,
+           a.name AS auction_name,
+           a.starts_at
+    FROM candidates i
+    JOIN auctions a ON a.id = i.auction_id
+    ORDER BY LOWER(i.title) LIKE %(prefix)s DESC,
+             similarity(LOWER(i.title), %(q)s) DESC,
+             a.starts_at DESC,
+             i.id
+    LIMIT %(limit)s
+"""
+
+# Полнотекстовый поиск по лотам (миграции 9 и 10). {where} — дополнительные
+# условия фильтра; параметры: строка запроса, параметры фильтра, лимит.
+# Ранжируются все совпадения, а дорогой ts_headline считается только для
+# строк, попавших в лимит. Подсвеченные слова обрамляются символами
+# SEARCH_HIGHLIGHT_START и SEARCH_HIGHLIGHT_STOP.
+SEARCH_HIGHLIGHT_START = "\x02"
+SEARCH_HIGHLIGHT_STOP = "\x03"
+
+ITEM_SEARCH_SQL = """
+    SELECT m.id,
+           m.title,
+           m.lot_number,
+           m.is_sold,
+           m.auction_id,
+           m.auction_name,
+           m.starts_at,
+           m.rank,
+           ts_headline('russian', m.title, m.query,
+                       'HighlightAll=true, StartSel=' || chr(2) || ', StopSel=' || chr(3))
+               AS title_highlight,
+           ts_headline('russian', COALESCE(m.description, ''), m.query,
+                       'MaxFragments=2, MaxWords=25, MinWords=8, '
+                       || 'StartSel=' || chr(2) || ', StopSel=' || chr(3))
+               AS description_highlight
+    FROM (
+        SELECT i.id,
+               i.title,
+               i.description,
+               i.lot_number,
+               i.is_sold,
+               a.id AS auction_id,
+               a.name AS auction_name,
+               a.starts_at,
+               ts_rank_cd(i.search_vector, q.query) AS rank,
+               q.query
+        FROM (SELECT websearch_to_tsquery('russian', %s) AS query) q
+        JOIN items i ON i.search_vector @@ q.query
+        JOIN auctions a ON a.id = i.auction_id
+        WHERE {where}
+        ORDER BY rank DESC, i.id
+        LIMIT %s
+    ) m
+    ORDER BY m.rank DESC, m.id
+"""
+
+# Состояние лота для книги ставок (миграция 12): стартовая цена и текущая
+# наибольшая ставка.
+LOT_STATE_SQL = """
+    SELECT i.id,
+           i.seller_id,
+           i.start_price,
+           i.is_sold,
+           b.amount AS high_bid,
+           b.bidder_id AS high_bidder_id
+    FROM items i
+    LEFT JOIN LATERAL (
+        SELECT amount, bidder_id
+        FROM bids
+        WHERE item_id = i.id
+        ORDER BY amount DESC, id
+        LIMIT 1
+    ) b ON TRUE
+    WHERE i.id = %s
+"""
+
+INSERT_BIDS_SQL = """
+    INSERT INTO bids (item_id, bidder_id, amount, placed_at)
+    VALUES %s
+"""
+
+AUCTION_REVENUE_SQL = """
+    SELECT a.id,
+           a.name,
+           a.location,
+           a.starts_at,
+           COALESCE(r.revenue, 0) AS revenue
+    FROM auctions a
+    LEFT JOIN (
+        SELECT auction_id, SUM(revenue) AS revenue
+        FROM revenue_by_auction_day
+        GROUP BY auction_id
+    ) r ON r.auction_id = a.id
+    ORDER BY revenue DESC, a.starts_at DESC
+"""
+
+SOLD_ITEMS_SQL = """
+    SELECT i.title,
+           i.lot_number,
+           a.name AS auction_name,
+           s.sold_price,
+           s.sold_at,
+           buyers.name AS buyer_name
+    FROM sales s
+    JOIN items i ON i.id = s.item_id
+    JOIN auctions a ON a.id = i.auction_id
+    JOIN participants buyers ON buyers.id = s.buyer_id
+    WHERE s.sold_at >= %s AND s.sold_at < %s
+    ORDER BY s.sold_at DESC
+"""
+
+SELLER_REVENUE_SQL = """
+    SELECT sellers.id,
+           sellers.name,
+           r.total
+    FROM (
+        SELECT seller_id, SUM(revenue) AS total
+        FROM revenue_by_seller_day
+        WHERE day >= %s AND day < %s
+        GROUP BY seller_id
+    ) r
+    JOIN participants sellers ON sellers.id = r.seller_id
+    ORDER BY r.total DESC
+"""
+
+BUYERS_IN_PERIOD_SQL = """
+    SELECT DISTINCT buyers.id, buyers.name
+    FROM participants buyers
+    JOIN sales s ON s.buyer_id = buyers.id
+    WHERE s.sold_at >= %s AND s.sold_at < %s
+    ORDER BY buyers.name
+"""
+
+BUYER_COUNTS_SQL = """
+    SELECT buyers.id, buyers.name, COUNT(s.id) AS items_bought
+    FROM participants buyers
+    JOIN sales s ON s.buyer_id = buyers.id
+    WHERE s.sold_at >= %s AND s.sold_at < %s
+    GROUP BY buyers.id
+    ORDER BY items_bought DESC, buyers.name
+"""
+
+SELLERS_PARTICIPATED_SQL = """
+    SELECT DISTINCT sellers.id, sellers.name
+    FROM participants sellers
+    JOIN items i ON i.seller_id = sellers.id
+    JOIN auctions a ON a.id = i.auction_id
+    WHERE a.starts_at >= %s AND a.starts_at < %s
+    ORDER BY sellers.name
+"""
+
+# Отчёты за период: имя -> запрос с параметрами из period_bounds.
+PERIOD_REPORTS = {
+    "sold_items": SOLD_ITEMS_SQL,
+    "seller_revenue": SELLER_REVENUE_SQL,
+    "buyers_in_period": BUYERS_IN_PERIOD_SQL,
+    "buyer_counts": BUYER_COUNTS_SQL,
+    "sellers_participated": SELLERS_PARTICIPATED_SQL,
+}
@@ -1,9 +1,16 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
-from typing import Dict
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from typing import Dict, Iterator, List, NamedTuple
 
 from db import AuctionDB
+from importer import TextStream
 
 
 def wipe_tables(db: AuctionDB) -> None:
@@ -102,29 +109,310 @@ def add_sales(db: AuctionDB, items: Dict[str, int], participants: Dict[str, int]
         ("Инсталляция «Пульс города»", "Галерея Сапфир", 125_000, now - timedelta(days=10)),
         ("Графика «Контуры»", "Иван Орлов", 95_000, now - timedelta(days=9)),
     ]
-    for title, buyer_name, price, sold_at in sales:
-        db.execute(
-            """
-            INSERT INTO sales (item_id, buyer_id, sold_price, sold_at)
-            VALUES (%s, %s, %s, %s)
-            """,
+    db.executemany(
+        """
+        INSERT INTO sales (item_id, buyer_id, sold_price, sold_at)
+        VALUES %s
+        """,
+        [
             (
                 items[title],
                 buyers[buyer_name],
                 price,
                 sold_at.isoformat(timespec="minutes"),
+            )
+            for title, buyer_name, price, sold_at in sales
+        ],
+    )
+
+
+# --- Синтетические данные для нагрузочного тестирования ---
+
+FIRST_NAMES = [
+    ("Александр", False), ("Мария", True), ("Дмитрий", False), ("Анна", True),
+    ("Сергей", False), ("Екатерина", True), ("Андрей", False), ("Ольга", True),
+    ("Михаил", False), ("Наталья", True), ("Павел", False), ("Татьяна", True),
+    ("Николай", False), ("Ирина", True), ("Владимир", False), ("Елена", True),
+]
+LAST_NAMES = [
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов",
+    "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров",
+]
+COMPANY_KINDS = ["Галерея", "Антикварный салон", "Студия", "Коллекция", "Аукционный дом"]
+COMPANY_NAMES = ["Сапфир", "Орфей", "Модерн", "Ампир", "Наследие", "Лазурь", "Гранат", "Империал"]
+
+# Место проведения -> относительная частота.
+LOCATIONS = {
+    "Москва": 50,
+    "Санкт-Петербург": 25,
+    "Казань": 8,
+    "Екатеринбург": 7,
+    "Новосибирск": 5,
+    "Нижний Новгород": 5,
+}
+# Тематика аукциона -> предметы.
+THEMES = {
+    "Живопись": ["Пейзаж", "Портрет", "Натюрморт", "Жанровая сцена", "Марина"],
+    "Графика": ["Офорт", "Литография", "Рисунок", "Акварель", "Гравюра"],
+    "Фарфор": ["Чайный сервиз", "Ваза", "Статуэтка", "Блюдо", "Кофейная пара"],
+    "Серебро": ["Кофейник", "Подстаканник", "Комплект подсвечников", "Портсигар", "Ковш"],
+    "Иконы": ["Икона", "Складень", "Киот", "Оклад"],
+    "Мебель": ["Бюро", "Комод", "Кресло", "Секретер", "Шкаф-витрина"],
+    "Книги и рукописи": ["Первое издание", "Альбом", "Рукопись", "Атлас", "Карта"],
+    "Ювелирные украшения": ["Брошь", "Кольцо", "Колье", "Серьги", "Браслет"],
+    "Нумизматика": ["Монета", "Набор монет", "Медаль", "Жетон"],
+    "Современное искусство": ["Инсталляция", "Холст", "Объект", "Фотография", "Скульптура"],
+}
+MOTIFS = [
+    "Утро в горах", "Зимний вечер", "Пульс города", "Контуры", "Старая усадьба", "Северное сияние",
+    "Летний сад", "Морской берег", "Осенний лес", "Весна", "Тишина", "Дорога домой",
+]
+MATERIALS = ["холст, масло", "бумага, тушь", "фарфор, роспись", "серебро 84 пробы", "дерево, резьба",
+             "бронза, литьё", "золото, эмаль", "смешанная техника"]
+ORIGINS = ["Россия", "Франция", "Германия", "Италия", "Австрия", "Англия", "Нидерланды"]
+CONDITIONS = ["Хорошая сохранность", "Следы реставрации", "Отличное состояние", "Мелкие утраты"]
+
+# Сезонность: относительная частота торгов по месяцам (январь..декабрь)
+# и по дням недели (понедельник..воскресенье).
+MONTH_WEIGHTS = [0.5, 0.8, 1.3, 1.5, 1.3, 0.7, 0.4, 0.4, 1.2, 1.5, 1.6, 1.3]
+WEEKDAY_WEIGHTS = [0.6, 0.8, 1.0, 1.3, 1.0, 1.4, 0.9]
+# Доля аукционов, назначенных на ближайшие 60 дней (без продаж).
+UPCOMING_SHARE = 0.03
+
+
+class ScaleOptions(NamedTuple):
+    participants: int
+    auctions: int
+    items_per_auction: int
+    sell_through: float
+    seed: int
+    zipf: float
+    years: int
+    until: date
+
+
+def _zipf_weights(count: int, exponent: float) -> List[float]:
+    return list(accumulate(1 / rank**exponent for rank in range(1, count + 1)))
+
+
+def _chunks(rows: Iterator[tuple]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= 1 << 16:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _copy(db: AuctionDB, table: str, columns: str, rows: Iterator[tuple]) -> None:
+    started = time.monotonic()
+    cur = db.conn.cursor()
+    cur.copy_expert(
+        f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", TextStream(_chunks(rows))
+    )
+    print(f"{table}: {cur.rowcount} строк за {time.monotonic() - started:.1f} с")
+
+
+def _participant_rows(options: ScaleOptions) -> Iterator[tuple]:
+    rng = random.Random(options.seed)
+    for participant_id in range(1, options.participants + 1):
+        if rng.random() < 0.2:
+            name = f"{rng.choice(COMPANY_KINDS)} «{rng.choice(COMPANY_NAMES)}»"
+            contact = f"info{participant_id}@example.com"
+        else:
+            first, female = rng.choice(FIRST_NAMES)
+            last = rng.choice(LAST_NAMES) + ("а" if female else "")
+            name = f"{first} {last}"
+            contact = f"+7 9{rng.randrange(10**9):09d}"
+        yield participant_id, name, contact, None
+
+
+def _auction_dates(options: ScaleOptions, rng: random.Random) -> List[datetime]:
+    first_day = options.until - timedelta(days=365 * options.years)
+    days = [first_day + timedelta(days=n) for n in range((options.until - first_day).days + 1)]
+    weights = [MONTH_WEIGHTS[d.month - 1] * WEEKDAY_WEIGHTS[d.weekday()] for d in days]
+    upcoming = [options.until + timedelta(days=n) for n in range(1, 61)]
+    dates = []
+    for _ in range(options.auctions):
+        if rng.random() < UPCOMING_SHARE:
+            day = rng.choice(upcoming)
+        else:
+            day = rng.choices(days, weights)[0]
+        hour = rng.choice([12, 15, 18, 19])
+        dates.append(datetime.combine(day, datetime.min.time()).replace(hour=hour))
+    return sorted(dates)
+
+
+def _auctions(options: ScaleOptions) -> List[tuple]:
+    rng = random.Random(options.seed + 1)
+    locations = list(LOCATIONS)
+    location_weights = list(LOCATIONS.values())
+    seasons = ["Зимние", "Зимние", "Весенние", "Весенние", "Весенние", "Летние",
+               "Летние", "Летние", "Осенние", "Осенние", "Осенние", "Зимние"]
+    auctions = []
+    for auction_id, starts_at in enumerate(_auction_dates(options, rng), start=1):
+        theme = rng.choice(list(THEMES))
+        name = f"{seasons[starts_at.month - 1]} торги «{theme}» №{auction_id}"
+        location = rng.choices(locations, location_weights)[0]
+        auctions.append((auction_id, name, location, starts_at, theme))
+    return auctions
+
+
+def _lots(
+    options: ScaleOptions,
+    auction: tuple,
+    sellers: List[int],
+    buyers: List[int],
+    cum_weights: List[float],
+) -> Iterator[tuple]:
+    """
+    Лоты аукциона и их продажи. Генератор с собственным зерном для каждого
+    аукциона: предметы и продажи выгружаются двумя проходами, и оба прохода
+    получают одинаковые данные без хранения миллионов строк в памяти.
+    """
+    auction_id, _, _, starts_at, theme = auction
+    rng = random.Random(options.seed * 1_000_003 + auction_id)
+    count = options.items_per_auction
+    item_sellers = rng.choices(sellers, cum_weights=cum_weights, k=count)
+    item_buyers = rng.choices(buyers, cum_weights=cum_weights, k=count)
+    sold_before = datetime.combine(options.until, datetime.min.time())
+    for lot in range(1, count + 1):
+        item_id = (auction_id - 1) * count + lot
+        seller_id = item_sellers[lot - 1]
+        title = f"{rng.choice(THEMES[theme])} «{rng.choice(MOTIFS)}»"
+        description = (
+            f"{rng.choice(MATERIALS).capitalize()}, {rng.choice(ORIGINS)}, "
+            f"{rng.randint(16, 20)} в. {rng.choice(CONDITIONS)}."
+        )
+        start_price = min(max(round(rng.lognormvariate(10.6, 1.0), -2), 1000), 9_999_999_900)
+        sale = None
+        if rng.random() < options.sell_through and starts_at < sold_before:
+            buyer_id = item_buyers[lot - 1]
+            if buyer_id == seller_id:
+                buyer_id = buyer_id % options.participants + 1
+            premium = rng.lognormvariate(-1.2, 0.6)
+            sold_price = min(start_price * (1 + premium), 9_999_999_999)
+            sold_at = starts_at + timedelta(seconds=lot * 90 + rng.randrange(60))
+            sale = (item_id, buyer_id, f"{sold_price:.2f}", sold_at)
+        yield (item_id, auction_id, seller_id, str(lot), title, f"{start_price:.2f}", description), sale
+
+
+def generate(db: AuctionDB, options: ScaleOptions) -> None:
+    """
+    Заполняет БД синтетическими данными заданного объёма через COPY.
+
+    Продавцы и покупатели выбираются по закону Ципфа (немногие участники
+    дают большую часть лотов и покупок), даты торгов — с учётом сезона и
+    дня недели. При одинаковых параметрах (включая ``until``) данные
+    совпадают побайтно.
+    """
+    cum_weights = _zipf_weights(options.participants, options.zipf)
+    ids = list(range(1, options.participants + 1))
+    sellers = random.Random(options.seed + 2).sample(ids, len(ids))
+    buyers = random.Random(options.seed + 3).sample(ids, len(ids))
+    auctions = _auctions(options)
+
+    with db.transaction():
+        # TRUNCATE сбрасывает и счётчики, и дневные сводки (см. миграции 3 и 5).
+        db.execute("TRUNCATE bids, sales, items, auctions, participants RESTART IDENTITY")
+        _copy(db, "participants", "id, name, contact_info, notes", _participant_rows(options))
+        _copy(
+            db,
+            "auctions",
+            "id, name, location, starts_at, description",
+            (
+                (auction_id, name, location, starts_at, f"{theme}. Синтетические данные.")
+                for auction_id, name, location, starts_at, theme in auctions
             ),
         )
+        _copy(
+            db,
+            "items",
+            "id, auction_id, seller_id, lot_number, title, start_price, description",
+            (
+                item
+                for auction in auctions
+                for item, _ in _lots(options, auction, sellers, buyers, cum_weights)
+            ),
+        )
+        _copy(
+            db,
+            "sales",
+            "item_id, buyer_id, sold_price, sold_at",
+            (
+                sale
+                for auction in auctions
+                for _, sale in _lots(options, auction, sellers, buyers, cum_weights)
+                if sale is not None
+            ),
+        )
+        for table in ("participants", "auctions", "items"):
+            db.get(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+            )
+    for table in ("participants", "auctions", "items", "sales"):
+        db.execute(f"ANALYZE {table}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Заполнить БД тестовыми данными. Без параметров загружается небольшой "
+            "демонстрационный набор; с любым из параметров объёма — синтетические данные."
+        )
+    )
+    parser.add_argument("--participants", type=int, help="Число участников (по умолчанию 10000)")
+    parser.add_argument("--auctions", type=int, help="Число аукционов (по умолчанию 1000)")
+    parser.add_argument(
+        "--items-per-auction", type=int, help="Лотов в каждом аукционе (по умолчанию 100)"
+    )
+    parser.add_argument(
+        "--sell-through", type=float, help="Доля проданных лотов прошедших торгов (по умолчанию 0.7)"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора случайных чисел")
+    parser.add_argument(
+        "--zipf", type=float, default=1.1, help="Показатель распределения Ципфа для участников"
+    )
+    parser.add_argument("--years", type=int, default=3, help="За сколько лет генерировать торги")
+    parser.add_argument(
+        "--until",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="Дата последних прошедших торгов, ГГГГ-ММ-ДД (по умолчанию сегодня)",
+    )
+    return parser.parse_args()
 
 
 def main() -> None:
+    args = parse_args()
+    sizes = (args.participants, args.auctions, args.items_per_auction, args.sell_through)
     db = AuctionDB()
     try:
-        wipe_tables(db)
-        participants = add_participants(db)
-        auctions = add_auctions(db)
-        items = add_items(db, participants, auctions)
-        add_sales(db, items, participants)
+        if any(size is not None for size in sizes):
+            options = ScaleOptions(
+                participants=args.participants or 10_000,
+                auctions=args.auctions or 1_000,
+                items_per_auction=args.items_per_auction or 100,
+                sell_through=args.sell_through if args.sell_through is not None else 0.7,
+                seed=args.seed,
+                zipf=args.zipf,
+                years=args.years,
+                until=args.until,
+            )
+            started = time.monotonic()
+            generate(db, options)
+            print(f"Синтетические данные загружены за {time.monotonic() - started:.1f} с.")
+            return
+        with db.transaction():
+            wipe_tables(db)
+            participants = add_participants(db)
+            auctions = add_auctions(db)
+            items = add_items(db, participants, auctions)
+            add_sales(db, items, participants)
         print("База данных успешно заполнена тестовыми данными.")
     finally:
         db.close()
@@ -0,0 +1,68 @@
+// Автодополнение для полей выбора: поле поиска с data-search-url,
+// <datalist> с подсказками и скрытое поле с id выбранной записи.
+(function () {
+  const DELAY_MS = 200;
+  const MIN_QUERY = 2;
+
+  function setup(input) {
+    const hidden = document.getElementById(input.dataset.target);
+    const list = document.getElementById(input.getAttribute("list"));
+    // Варианты, отрисованные сервером (например, выбранный ранее фильтр).
+    let ids = new Map(
+      Array.from(list.options, (option) => [option.value, option.dataset.id])
+    );
+    let timer = null;
+    let controller = null;
+
+    function sync() {
+      const id = ids.get(input.value);
+      hidden.value = id === undefined ? "" : id;
+      input.setCustomValidity(
+        input.value && id === undefined ? "Выберите значение из списка." : ""
+      );
+    }
+
+    async function load() {
+      const query = input.value.trim();
+      if (query.length < MIN_QUERY) {
+        return;
+      }
+      if (controller) {
+        controller.abort();
+      }
+      controller = new AbortController();
+      const url = new URL(input.dataset.searchUrl, window.location.origin);
+      url.searchParams.set("q", query);
+      let response;
+      try {
+        response = await fetch(url, { signal: controller.signal });
+      } catch (error) {
+        return;
+      }
+      if (!response.ok) {
+        return;
+      }
+      const data = await response.json();
+      ids = new Map();
+      list.replaceChildren();
+      for (const row of data.results) {
+        // Одинаковые подписи различаются по id, иначе их нельзя выбрать.
+        const label = ids.has(row.label) ? `${row.label} (#${row.id})` : row.label;
+        ids.set(label, row.id);
+        const option = document.createElement("option");
+        option.value = label;
+        list.appendChild(option);
+      }
+      sync();
+    }
+
+    input.addEventListener("input", () => {
+      sync();
+      clearTimeout(timer);
+      timer = setTimeout(load, DELAY_MS);
+    });
+    input.addEventListener("change", sync);
+  }
+
+  document.querySelectorAll("input[data-search-url]").forEach(setup);
+})();